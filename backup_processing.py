@@ -1,108 +1,1205 @@
 import os
+import sys
+import errno
+import mmap
+import math
+import zlib
+import contextlib
+import time
+import hashlib
+import hmac
+import io
+import json
+import functools
+import struct
+import tarfile
 import pyzipper # Para ZIP con encriptación AES
-import shutil
-import dask
-from dask.diagnostics import ProgressBar
+from pyzipper import zipfile_aes
+from Cryptodome.Cipher import AES
+from Cryptodome.Util import Counter
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import threading
+import queue
 import logging
+import multiprocessing
+
+# DEFLATE acelerado con ISA-L (SIMD) si está instalado; si no, zlib estándar.
+try:
+    from isal import isal_zlib as deflate_backend
+    ISAL_AVAILABLE = True
+except ImportError:
+    deflate_backend = zlib
+    ISAL_AVAILABLE = False
+
+# Formato alternativo tar.zst (zstandard) con cifrado AES-GCM (cryptography/OpenSSL).
+# NumPy (opcional) acelera la sonda de entropía; sin él se cuenta en Python.
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import zstandard as zstd
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.exceptions import InvalidTag
+    AESGCM_AVAILABLE = True
+except ImportError:
+    AESGCM_AVAILABLE = False
+
+# io_uring (liburing, solo Linux) para la escritura de archivos al restaurar;
+# sin él cada hilo de extracción escribe y cierra sincrónicamente.
+try:
+    if not sys.platform.startswith('linux'):
+        raise ImportError("io_uring solo existe en Linux")
+    from liburing import (Ring, Cqe, IOSQE_IO_LINK, io_uring_queue_init, io_uring_queue_exit,
+                          io_uring_get_sqe, io_uring_prep_write, io_uring_prep_close,
+                          io_uring_sqe_set_data64, io_uring_sqe_set_flags, io_uring_submit,
+                          io_uring_wait_cqe, io_uring_cq_advance)
+    URING_AVAILABLE = True
+except ImportError:
+    URING_AVAILABLE = False
 
 logging.getLogger('pyzipper').setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# Nivel 1 de ISA-L comprime de forma similar al nivel 6 de zlib, mucho más rápido;
+# sin ISA-L se mantiene el nivel por defecto de zlib.
+DEFAULT_COMPRESSLEVEL = 1 if ISAL_AVAILABLE else 6
+
+# Pools compartidos por todo el proceso: hilos para E/S (extracción, fragmentos) y
+# procesos para la compresión, que es CPU-bound. Los workers se crean bajo demanda.
+_NUM_WORKERS = os.cpu_count() or 1
+_IO_POOL = ThreadPoolExecutor(max_workers=_NUM_WORKERS * 2)
+# Los procesos se crean desde un forkserver (que ya importó este módulo) y no con fork():
+# el proceso principal tiene hilos vivos (pool de E/S, refresco del token de Drive) y un
+# fork() heredaría los locks que tuvieran tomados en ese momento.
+if 'forkserver' in multiprocessing.get_all_start_methods():
+    _MP_CONTEXT = multiprocessing.get_context('forkserver')
+    _MP_CONTEXT.set_forkserver_preload([__name__])
+else:
+    _MP_CONTEXT = None # spawn por defecto en Windows y macOS
+# El pool se construye en el primer uso: los procesos hijos también importan este
+# módulo y no deben crear (ni dejar sin liberar) las colas y semáforos de otro pool.
+_CPU_POOL = None
+_CPU_POOL_LOCK = threading.Lock()
+
+def _cpu_pool():
+    global _CPU_POOL
+    with _CPU_POOL_LOCK:
+        if _CPU_POOL is None:
+            _CPU_POOL = ProcessPoolExecutor(max_workers=_NUM_WORKERS, mp_context=_MP_CONTEXT)
+        return _CPU_POOL
+
+# Los archivos pequeños se comprimen en paralelo en un pool de procesos, en lotes.
+# Los mayores a este tamaño se comprimen en streaming para no cargarlos en memoria.
+PARALLEL_MAX_FILE_SIZE = 8 * 1024 * 1024
+# Un lote se cierra al llegar a cualquiera de los dos límites
+PARALLEL_BATCH_FILES = 32
+PARALLEL_BATCH_BYTES = 8 * 1024 * 1024
+# Bytes de entrada enviados al pool y aún no escritos al ZIP: acota la memoria que
+# retienen en el proceso principal los resultados pendientes, sea cual sea el número de CPUs
+PARALLEL_MAX_PENDING_BYTES = 128 * 1024 * 1024
+
+# Modo sólido: los archivos pequeños se agrupan en bloques tar que se comprimen como
+# un único miembro, con un índice (bloque -> archivos) guardado dentro del mismo ZIP.
+SOLID_MAX_FILE_SIZE = 64 * 1024
+SOLID_BLOCK_SIZE = 4 * 1024 * 1024
+SOLID_BLOCK_NAME = '_solid_{:03d}.tar'
+SOLID_INDEX_NAME = '_solid_index.json'
+
+# Por debajo de este tamaño read() es más barato que mmap().
+MMAP_MIN_FILE_SIZE = 64 * 1024
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Extensiones de formatos ya comprimidos: se guardan sin DEFLATE (ZIP_STORED).
+NON_COMPRESSIBLE_EXTENSIONS = frozenset({
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.zst', '.7z', '.rar',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic',
+    '.mp4', '.m4v', '.mkv', '.mov', '.webm', '.avi',
+    '.mp3', '.m4a', '.aac', '.ogg', '.opus', '.flac',
+    '.pdf', '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp', '.epub', '.jar', '.apk',
+})
+# Firmas (offset, bytes) de formatos comprimidos, para archivos con extensión genérica.
+_COMPRESSED_MAGIC = (
+    (0, b'PK\x03\x04'), (0, b'\x1f\x8b'), (0, b'BZh'), (0, b'\xfd7zXZ\x00'),
+    (0, b"7z\xbc\xaf'\x1c"), (0, b'\x28\xb5\x2f\xfd'), (0, b'Rar!\x1a\x07'),
+    (0, b'\xff\xd8\xff'), (0, b'\x89PNG\r\n\x1a\n'), (0, b'GIF8'),
+    (4, b'ftyp'), (0, b'\x1a\x45\xdf\xa3'), (0, b'ID3'), (0, b'fLaC'), (0, b'OggS'),
+)
+
+# Sonda de entropía sobre el inicio del archivo: por encima de este umbral (bits/byte)
+# el contenido parece aleatorio (cifrado o comprimido) y se guarda sin DEFLATE.
+# Solo se aplica a archivos grandes, donde un DEFLATE inútil cuesta más que la sonda.
+ENTROPY_PROBE_SIZE = 4096
+ENTROPY_PROBE_MIN_FILE_SIZE = 64 * 1024
+INCOMPRESSIBLE_ENTROPY = 7.9
+
+# sendfile() entre archivos regulares solo está garantizado en Linux.
+_SENDFILE_TO_FILE = sys.platform.startswith('linux') and hasattr(os, 'sendfile')
+# Errores con los que una copia en el kernel no es posible y se prueba el siguiente método
+# (EBADF/EPERM: copy_file_range con fds en O_APPEND o en algunos FUSE).
+_COPY_FALLBACK_ERRNOS = frozenset({errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+                                   errno.ENOTSUP, errno.EBADF, errno.EPERM})
+
+# En la restauración los miembros se agrupan por directorio destino; cada tarea abre el
+# directorio una vez y crea sus archivos relativos a él (openat).
+RESTORE_GROUP_SIZE = 64
+# Hasta este tamaño un miembro se descomprime entero y se escribe con una sola llamada.
+RESTORE_READ_ALL_MAX = 8 * 1024 * 1024
+_DIR_FD_SUPPORTED = os.open in os.supports_dir_fd and hasattr(os, 'O_DIRECTORY')
+_RESTORE_OPEN_FLAGS = (os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+                       | getattr(os, 'O_BINARY', 0) | getattr(os, 'O_CLOEXEC', 0))
+# Errores de extracción pendientes de mostrar; los que no caben solo se cuentan.
+ERROR_QUEUE_SIZE = 1024
+# Escrituras en vuelo por hilo con io_uring: número de archivos y bytes retenidos.
+URING_QUEUE_DEPTH = 64
+# IORING_OP_READ/WRITE/CLOSE existen desde Linux 5.6; antes el ring se crea pero cada
+# operación termina con -EINVAL
+URING_MIN_KERNEL = (5, 6)
+URING_MAX_INFLIGHT_BYTES = 64 * 1024 * 1024
+
+# tar.zst: nivel 3 con ventana de 128 MiB (equivalente a `zstd -3 --long=27`).
+ZSTD_LEVEL = 3
+ZSTD_WINDOW_LOG = 27
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+# Contenedor AES-256-GCM por bloques: cabecera [magia | versión, log2 N, r, p de scrypt
+# | tamaño de bloque | salt | prefijo de nonce]; cada bloque lleva su propio tag.
+_GCM_MAGIC = b'BKOPTGCM'
+_GCM_VERSION = 1
+_GCM_HEADER = struct.Struct('<BBBBI16s7s')
+_GCM_CHUNK_SIZE = 1024 * 1024
+_GCM_TAG_SIZE = 16
+_SCRYPT_LOG_N, _SCRYPT_R, _SCRYPT_P = 15, 8, 1
+
+
+def _deflate_compressobj(compresslevel=None):
+    """ Compresor DEFLATE crudo (wbits=-15), el formato que usa ZIP_DEFLATED. """
+    if compresslevel is None:
+        compresslevel = DEFAULT_COMPRESSLEVEL
+    if ISAL_AVAILABLE: # ISA-L solo admite niveles 0-3
+        compresslevel = min(compresslevel, deflate_backend.ISAL_BEST_COMPRESSION)
+    return deflate_backend.compressobj(compresslevel, deflate_backend.DEFLATED, -15)
+
+def _copy_file_range_chunk(src_fd, dst_fd, offset, count):
+    return os.copy_file_range(src_fd, dst_fd, count, offset)
+
+def _sendfile_chunk(src_fd, dst_fd, offset, count):
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+_KERNEL_COPY_CHUNK_FUNCS = tuple(
+    func for func, available in ((_copy_file_range_chunk, hasattr(os, 'copy_file_range')),
+                                 (_sendfile_chunk, _SENDFILE_TO_FILE))
+    if available
+)
+
+def _copy_range(src_fd, dst_fd, offset, length):
+    """
+    Copia `length` bytes de src_fd desde `offset` a la posición actual de dst_fd.
+    Usa copy_file_range (Linux >= 5.3, reflink en btrfs/XFS) o sendfile, de modo que
+    los datos no pasan por Python; si ninguno aplica, recurre a pread/write.
+    Devuelve los bytes copiados (menos de `length` si el origen termina antes).
+    """
+    copied = 0
+    for copy_chunk in _KERNEL_COPY_CHUNK_FUNCS:
+        try:
+            while copied < length:
+                n = copy_chunk(src_fd, dst_fd, offset + copied, length - copied)
+                if n == 0:
+                    return copied
+                copied += n
+            return copied
+        except OSError as e:
+            if e.errno not in _COPY_FALLBACK_ERRNOS:
+                raise
+    # Un único buffer reutilizado para todo el rango: sin un bytes nuevo por lectura
+    view = memoryview(bytearray(min(STREAM_CHUNK_SIZE, length - copied)))
+    while copied < length:
+        n = _pread_into(src_fd, view[:length - copied], offset + copied)
+        if not n:
+            break
+        _write_all(dst_fd, view[:n])
+        copied += n
+    return copied
+
+def _pread_into(fd, view, offset):
+    """ Lee en `view` desde `offset` sin mover la posición compartida del fd si es posible. """
+    if hasattr(os, 'preadv'):
+        return os.preadv(fd, [view], offset)
+    if hasattr(os, 'pread'):
+        data = os.pread(fd, len(view), offset)
+    else: # Windows: sin pread; cada tarea abre su propio fd, así que lseek es seguro
+        os.lseek(fd, offset, os.SEEK_SET)
+        data = os.read(fd, len(view))
+    view[:len(data)] = data
+    return len(data)
+
+def _write_all(fd, data):
+    """ os.write hasta agotar el buffer (una escritura puede ser parcial). """
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def _pwrite_all(fd, data, offset):
+    """ os.pwrite desde `offset` hasta agotar el buffer, sin usar la posición del fd. """
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+def _preallocate(fd, size):
+    """
+    Reserva `size` bytes para el archivo (extents contiguos, menos metadatos por escritura).
+    Devuelve False si no se reservó (tamaño 0 o sistema de archivos sin soporte).
+    """
+    if not size or not hasattr(os, 'posix_fallocate'):
+        return False
+    try:
+        os.posix_fallocate(fd, 0, size)
+        return True
+    except OSError as e:
+        if e.errno not in _COPY_FALLBACK_ERRNOS: # Sistema de archivos sin soporte
+            raise
+        return False
+
+@contextlib.contextmanager
+def _map(filepath):
+    """
+    Expone el contenido de un archivo como memoryview de solo lectura.
+    Los archivos grandes se mapean con mmap para leer directo del page cache.
+    """
+    mm = None
+    with open(filepath, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < MMAP_MIN_FILE_SIZE:
+            data = f.read()
+        else:
+            mm = data = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                mm.madvise(mmap.MADV_SEQUENTIAL) # Favorece el readahead del kernel
+    try:
+        with memoryview(data) as view:
+            yield view
+    finally:
+        if mm is not None:
+            mm.close()
+
+def _write_view(dest, view):
+    """ Escribe un memoryview en un miembro abierto, en bloques de STREAM_CHUNK_SIZE. """
+    for offset in range(0, len(view), STREAM_CHUNK_SIZE):
+        dest.write(view[offset:offset + STREAM_CHUNK_SIZE])
+
+def _fast_crc32(fileno):
+    """ CRC32 (acelerado por hardware con ISA-L) de un archivo abierto, vía mmap. """
+    size = os.fstat(fileno).st_size
+    if not size:
+        return 0
+    with mmap.mmap(fileno, size, access=mmap.ACCESS_READ) as mm:
+        return deflate_backend.crc32(mm)
+
+def _compress_type_for(filepath):
+    """ ZIP_STORED para formatos ya comprimidos, ZIP_DEFLATED para el resto. """
+    if os.path.splitext(filepath)[1].lower() in NON_COMPRESSIBLE_EXTENSIONS:
+        return pyzipper.ZIP_STORED
+    return pyzipper.ZIP_DEFLATED
+
+def _byte_entropy(sample):
+    """ Entropía de Shannon (bits/byte) de la muestra. """
+    if NUMPY_AVAILABLE:
+        counts = np.bincount(np.frombuffer(sample, dtype=np.uint8), minlength=256)
+        p = counts[counts > 0] / len(sample)
+        return float(-(p * np.log2(p)).sum())
+    total = len(sample)
+    counts = (sample.count(byte) for byte in range(256))
+    return -sum(c / total * math.log2(c / total) for c in counts if c)
+
+def _looks_incompressible(view):
+    """
+    Detecta contenido ya comprimido que no tiene una extensión conocida: por su firma
+    o, si no la tiene, porque los primeros bytes tienen una entropía casi máxima.
+    """
+    head = bytes(view[:16])
+    if any(head.startswith(magic, offset) for offset, magic in _COMPRESSED_MAGIC):
+        return True
+    if len(view) < ENTROPY_PROBE_MIN_FILE_SIZE:
+        return False
+    return _byte_entropy(bytes(view[:ENTROPY_PROBE_SIZE])) >= INCOMPRESSIBLE_ENTROPY
+
+
+class _BackupZipWriteFile(pyzipper.zipfile._ZipWriteFile):
+    """ Escritor de miembros ZIP que comprime con el backend DEFLATE del módulo. """
+
+    def __init__(self, zf, zinfo, zip64, encrypter=None):
+        super().__init__(zf, zinfo, zip64, encrypter)
+        if zinfo.compress_type == pyzipper.ZIP_DEFLATED:
+            self._compressor = _deflate_compressobj(zinfo._compresslevel)
+
+    def write(self, data):
+        # Igual que _ZipWriteFile.write, pero con el CRC32 del backend (ISA-L)
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+        nbytes = len(data)
+        self._file_size += nbytes
+        self._crc = deflate_backend.crc32(data, self._crc)
+        if self._compressor:
+            data = self._compressor.compress(data)
+        if self._encrypter:
+            data = self._encrypter.encrypt(data)
+        self._compress_size += len(data)
+        self._fileobj.write(data)
+        return nbytes
+
+    def write_from_fd(self, src_fd, crc, file_size):
+        """ Copia un archivo sin comprimir ni encriptar en el kernel, sin pasar por Python. """
+        self._file_size = file_size
+        self._crc = crc
+        fp = self._fileobj
+        fp.flush()
+        start = fp.tell()
+        copied = _copy_range(src_fd, fp.fileno(), 0, file_size)
+        fp.seek(start + copied) # Resincroniza la posición del buffer de Python
+        if copied != file_size:
+            raise IOError(f"El archivo {self._zinfo.filename} se truncó durante el respaldo.")
+        self._compress_size += copied
+
+    def write_compressed(self, payload, crc, file_size):
+        """ Escribe datos ya comprimidos (DEFLATE crudo) cuyo CRC y tamaño se conocen. """
+        self._compressor = None # Evita que close() añada un bloque final vacío
+        self._file_size = file_size
+        self._crc = crc
+        if self._encrypter:
+            payload = self._encrypter.encrypt(payload)
+        self._compress_size += len(payload)
+        self._fileobj.write(payload)
+
+
+def _wz_aes_keys(pwd, salt, key_length):
+    """ Deriva (clave AES, clave HMAC, verificador de contraseña) según WinZip AES. """
+    keymaterial = hashlib.pbkdf2_hmac('sha1', pwd, salt, 1000, 2 * key_length + 2)
+    return keymaterial[:key_length], keymaterial[key_length:2 * key_length], keymaterial[2 * key_length:]
+
+def _wz_aes_cipher(key):
+    # WZ_AES usa un contador little-endian, que el modo CTR de OpenSSL no admite;
+    # pycryptodome ya cifra con AES-NI cuando el procesador lo soporta.
+    return AES.new(key, AES.MODE_CTR, counter=Counter.new(nbits=128, little_endian=True))
 
 
-def get_all_file_paths(source_folders):
-    """ Recorre las carpetas y obtiene todas las rutas de archivos. """
-    file_paths = []
+class _AESZipEncrypter(zipfile_aes.AESZipEncrypter):
+    """
+    Encriptador WZ_AES de 256 bits con PBKDF2 y HMAC-SHA1 de OpenSSL (hashlib/hmac),
+    que aprovechan SHA-NI; pyzipper los calcula con pycryptodome.
+    """
+
+    def __init__(self, pwd):
+        # No se llama a super().__init__ para no derivar las claves dos veces
+        if not pwd:
+            raise RuntimeError('%s encryption requires a password.' % zipfile_aes.WZ_AES)
+        self.force_wz_aes_version = None
+        self.conditionally_include_crc = None
+        self.min_bytes_to_include_crc = None
+        self.aes_strength = 3 # 256 bits
+        self.salt_length = zipfile_aes.WZ_SALT_LENGTHS[self.aes_strength]
+        self.salt = os.urandom(self.salt_length)
+        enckey, mackey, self.encpwdverify = _wz_aes_keys(
+            pwd, self.salt, zipfile_aes.WZ_KEY_LENGTHS[self.aes_strength])
+        self.encrypter = _wz_aes_cipher(enckey)
+        self.hmac = hmac.new(mackey, digestmod='sha1')
+
+
+class _AESZipDecrypter(zipfile_aes.AESZipDecrypter):
+    """ Desencriptador WZ_AES con PBKDF2 y HMAC-SHA1 de OpenSSL. """
+
+    def __init__(self, zinfo, pwd, encryption_header):
+        self.filename = zinfo.filename
+        key_length = zipfile_aes.WZ_KEY_LENGTHS[zinfo.wz_aes_strength]
+        salt_length = zipfile_aes.WZ_SALT_LENGTHS[zinfo.wz_aes_strength]
+        salt = encryption_header[:salt_length]
+        enckey, mackey, pwd_verify = _wz_aes_keys(pwd, salt, key_length)
+        if pwd_verify != encryption_header[salt_length:]:
+            raise RuntimeError("Bad password for file %r" % zinfo.filename)
+        self.decypter = _wz_aes_cipher(enckey) # Nombre de atributo usado por pyzipper
+        self.hmac = hmac.new(mackey, digestmod='sha1')
+
+
+class _BackupZipExtFile(zipfile_aes.AESZipExtFile):
+    """ Lector de miembros que desencripta con _AESZipDecrypter. """
+
+    def setup_aeszipdecrypter(self):
+        super().setup_aeszipdecrypter()
+        return _AESZipDecrypter
+
+
+class BackupZipFile(pyzipper.AESZipFile):
+    """
+    AESZipFile que usa ISA-L/zlib para DEFLATE y OpenSSL para PBKDF2/HMAC de WZ_AES.
+    La encriptación AES (si se configura) se aplica sobre el flujo ya comprimido.
+    """
+    zipwritefile_cls = _BackupZipWriteFile
+    zipextfile_cls = _BackupZipExtFile
+
+    def __init__(self, *args, central_directory=None, **kwargs):
+        # Lista de ZipInfo ya parseada por otro handle del mismo archivo; solo para lectura
+        self._central_directory = central_directory
+        super().__init__(*args, **kwargs)
+
+    def _RealGetContents(self):
+        if self._central_directory is None:
+            return super()._RealGetContents()
+        for zinfo in self._central_directory:
+            self.filelist.append(zinfo)
+            self.NameToInfo[zinfo.filename] = zinfo
+
+    def get_encrypter(self):
+        if self.encryption == pyzipper.WZ_AES and not self.encryption_kwargs:
+            return _AESZipEncrypter(self.pwd)
+        return super().get_encrypter()
+
+    def write_compressed(self, zinfo, compress_type, payload, crc, file_size):
+        """ Añade un miembro cuyo contenido fue comprimido (o no) previamente por un worker. """
+        zinfo.compress_type = compress_type
+        zinfo.file_size = file_size
+        with self._lock:
+            with self.open(zinfo, mode='w') as dest:
+                dest.write_compressed(payload, crc, file_size)
+
+    def write_streamed(self, zinfo, filepath):
+        """
+        Añade un archivo grande comprimiéndolo por bloques en este proceso.
+        Si su contenido ya está comprimido, se guarda con write_stored.
+        """
+        with _map(filepath) as view:
+            if not _looks_incompressible(view):
+                with self.open(zinfo, mode='w') as dest:
+                    _write_view(dest, view)
+                return
+        self.write_stored(zinfo, filepath)
+
+    def write_stored(self, zinfo, filepath):
+        """
+        Añade un archivo sin DEFLATE. Sin encriptación el CRC se calcula sobre
+        un mmap y los bytes se copian con _copy_range; con AES se hace streaming.
+        """
+        zinfo.compress_type = pyzipper.ZIP_STORED
+        if self.encryption is not None:
+            with _map(filepath) as view:
+                zinfo.file_size = len(view)
+                with self.open(zinfo, mode='w') as dest:
+                    _write_view(dest, view)
+            return
+
+        with open(filepath, 'rb') as src:
+            zinfo.file_size = os.fstat(src.fileno()).st_size
+            with self.open(zinfo, mode='w') as dest:
+                dest.write_from_fd(src.fileno(), _fast_crc32(src.fileno()), zinfo.file_size)
+
+
+def _compress_file(filepath, compresslevel):
+    """
+    Comprime un archivo completo a DEFLATE crudo. Devuelve (tipo de compresión,
+    datos, crc32, tamaño); el contenido ya comprimido se devuelve tal cual (ZIP_STORED).
+    """
+    with _map(filepath) as view:
+        return _compress_view(view, compresslevel)
+
+def _compress_view(view, compresslevel):
+    crc = deflate_backend.crc32(view)
+    if _looks_incompressible(view):
+        return pyzipper.ZIP_STORED, bytes(view), crc, len(view)
+    compressor = _deflate_compressobj(compresslevel)
+    payload = compressor.compress(view) + compressor.flush()
+    return pyzipper.ZIP_DEFLATED, payload, crc, len(view)
+
+def _compress_batch(filepaths, compresslevel):
+    """ Tarea del pool de procesos: comprime un lote de archivos pequeños. """
+    return [_compress_file(filepath, compresslevel) for filepath in filepaths]
+
+def _compress_solid_block(entries, compresslevel):
+    """
+    Tarea del pool de procesos: empaqueta (ruta, nombre en el ZIP) en un tar en
+    memoria y lo comprime como un solo miembro, con un diccionario LZ77 compartido.
+    """
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w', dereference=True) as tar:
+        for filepath, arcname in entries:
+            tar.add(filepath, arcname=arcname, recursive=False)
+    with buf.getbuffer() as view:
+        return [_compress_view(view, compresslevel)]
+
+
+def iter_files(source_folders):
+    """
+    Recorre las carpetas con os.scandir y produce (ruta, nombre_en_zip, stat) por
+    cada archivo. El nombre es relativo al padre de la carpeta fuente más específica.
+    El tipo de entrada viene del propio directorio, sin un stat() extra por entrada.
+    """
+    # Carpeta fuente -> longitud del prefijo (su directorio padre) a recortar de cada ruta
+    source_prefix_lengths = {}
     for folder in source_folders:
         abs_folder = os.path.abspath(folder)
         if not os.path.isdir(abs_folder):
             print(f"Advertencia: La carpeta fuente {abs_folder} no existe o no es un directorio.")
             continue
-        for root, _, files in os.walk(abs_folder):
-            for file in files:
-                file_paths.append(os.path.join(root, file))
-    return file_paths
+        source_prefix_lengths[abs_folder] = len(os.path.join(os.path.dirname(abs_folder), ''))
+
+    for abs_folder, prefix_length in source_prefix_lengths.items():
+        stack = [abs_folder]
+        while stack:
+            current_dir = stack.pop()
+            try:
+                with os.scandir(current_dir) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            # Una carpeta fuente anidada se recorre con su propio prefijo
+                            if entry.path not in source_prefix_lengths:
+                                stack.append(entry.path)
+                        elif entry.is_file(): # Como os.walk, incluye enlaces a archivos
+                            yield entry.path, entry.path[prefix_length:], entry.stat()
+            except OSError as e:
+                print(f"Advertencia: No se pudo leer el directorio {current_dir}: {e}")
 
-def create_backup_archive(source_folders, output_zip_path, compress_type='zip', password=None):
+def _zipinfo_from_stat(zipinfo_cls, arcname, st):
+    """ Equivalente a ZipInfo.from_file reutilizando el stat del recorrido. """
+    zinfo = zipinfo_cls(arcname, time.localtime(st.st_mtime)[0:6])
+    zinfo.external_attr = (st.st_mode & 0xFFFF) << 16 # Atributos Unix
+    zinfo.file_size = st.st_size
+    return zinfo
+
+def _write_compressed_batch(zf, batch, future):
+    """ Escribe en el ZIP, en orden, los resultados de un lote comprimido en paralelo. """
+    for zinfo, (compress_type, payload, crc, file_size) in zip(batch, future.result()):
+        zf.write_compressed(zinfo, compress_type, payload, crc, file_size)
+
+def create_backup_archive(source_folders, output_zip_path, compress_type='zip', password=None,
+                          compresslevel=DEFAULT_COMPRESSLEVEL, solid=False):
     """
     Crea un archivo ZIP, opcionalmente encriptado con AES-256.
-    La escritura al archivo ZIP es secuencial.
+    La compresión DEFLATE usa ISA-L cuando está disponible y se reparte entre
+    un pool de procesos; la escritura al archivo ZIP es secuencial.
+    Con `solid` los archivos pequeños se agrupan en bloques tar (ver SOLID_BLOCK_SIZE).
     """
+    if compress_type == 'zst':
+        return create_tar_zst_archive(source_folders, output_zip_path, password=password)
     if compress_type != 'zip':
-        raise NotImplementedError("Solo compresión ZIP con pyzipper está implementada.")
-
-    all_files_to_backup = get_all_file_paths(source_folders)
+        raise NotImplementedError(f"Formato de compresión no soportado: {compress_type}.")
 
-
-    if not all_files_to_backup:
-        print("No se encontraron archivos para respaldar.")
     output_dir = os.path.dirname(os.path.abspath(output_zip_path))
     if not os.path.exists(output_dir):
         os.makedirs(output_dir, exist_ok=True)
     
-    print(f"Creando archivo ZIP en {output_zip_path} con {len(all_files_to_backup)} archivos...")
+    print(f"Creando archivo ZIP en {output_zip_path}...")
+
+    pending = deque() # (lote de ZipInfo, future, bytes de entrada) en orden de envío
+    pending_bytes = 0
 
-    with pyzipper.AESZipFile(output_zip_path,
-                             'w',
-                             compression=pyzipper.ZIP_DEFLATED,
-                             encryption=(pyzipper.WZ_AES if password else None)) as zf:
+    with BackupZipFile(output_zip_path,
+                       'w',
+                       compression=pyzipper.ZIP_DEFLATED,
+                       compresslevel=compresslevel,
+                       encryption=(pyzipper.WZ_AES if password else None)) as zf:
         if password:
             zf.setpassword(password.encode('utf-8'))
-        
-        for filepath in all_files_to_backup:
-            arcname = None
-            matched_source_folder = None
-            for sf_raw in source_folders:
-                sf = os.path.abspath(sf_raw)
-                if os.path.abspath(filepath).startswith(sf):
-                    if matched_source_folder is None or len(sf) > len(matched_source_folder):
-                        matched_source_folder = sf
-            
-            if matched_source_folder:
-                base_source_name = os.path.basename(matched_source_folder)
-                relative_path_from_matched_source_parent = os.path.relpath(filepath, os.path.dirname(matched_source_folder))
-                arcname = relative_path_from_matched_source_parent
-            else:
-                arcname = os.path.basename(filepath)
-            
-            zf.write(filepath, arcname=arcname)
-            
-    print(f"Archivo ZIP '{output_zip_path}' creado exitosamente.")
+
+        batch, batch_paths, batch_size = [], [], 0
+        solid_entries, solid_size = [], 0
+        solid_index = {} # bloque -> nombres en el ZIP de los archivos que contiene
+        num_files = 0
+
+        def write_oldest():
+            nonlocal pending_bytes
+            done_batch, future, size = pending.popleft()
+            _write_compressed_batch(zf, done_batch, future)
+            pending_bytes -= size
+
+        def submit(batch, size, func, *args):
+            nonlocal pending_bytes
+            while pending and pending_bytes + size > PARALLEL_MAX_PENDING_BYTES:
+                write_oldest()
+            pending.append((batch, _cpu_pool().submit(func, *args, compresslevel), size))
+            pending_bytes += size
+
+        def submit_solid_block(entries, size):
+            block_name = SOLID_BLOCK_NAME.format(len(solid_index))
+            solid_index[block_name] = [arcname for _, arcname in entries]
+            block_zinfo = zf.zipinfo_cls(block_name, time.localtime()[0:6])
+            block_zinfo.external_attr = 0o644 << 16
+            block_zinfo._compresslevel = compresslevel
+            submit([block_zinfo], size, _compress_solid_block, entries)
+
+        # Los archivos se comprimen a medida que se descubren, sin listarlos antes
+        for filepath, arcname, st in iter_files(source_folders):
+            num_files += 1
+            zinfo = _zipinfo_from_stat(zf.zipinfo_cls, arcname, st)
+            zinfo.compress_type = _compress_type_for(filepath)
+            zinfo._compresslevel = compresslevel
+
+            if zinfo.compress_type == pyzipper.ZIP_STORED:
+                zf.write_stored(zinfo, filepath)
+                continue
+
+            if solid and zinfo.file_size < SOLID_MAX_FILE_SIZE:
+                solid_entries.append((filepath, arcname))
+                solid_size += zinfo.file_size + tarfile.BLOCKSIZE
+                if solid_size >= SOLID_BLOCK_SIZE:
+                    submit_solid_block(solid_entries, solid_size)
+                    solid_entries, solid_size = [], 0
+                continue
+
+            if zinfo.file_size > PARALLEL_MAX_FILE_SIZE:
+                # Archivo grande: streaming en este proceso mientras el pool sigue trabajando
+                zf.write_streamed(zinfo, filepath)
+                continue
+
+            if batch and batch_size + zinfo.file_size > PARALLEL_BATCH_BYTES:
+                submit(batch, batch_size, _compress_batch, batch_paths)
+                batch, batch_paths, batch_size = [], [], 0
+            batch.append(zinfo)
+            batch_paths.append(filepath)
+            batch_size += zinfo.file_size
+            if len(batch) == PARALLEL_BATCH_FILES:
+                submit(batch, batch_size, _compress_batch, batch_paths)
+                batch, batch_paths, batch_size = [], [], 0
+
+        if batch:
+            submit(batch, batch_size, _compress_batch, batch_paths)
+        if solid_entries:
+            submit_solid_block(solid_entries, solid_size)
+        while pending:
+            write_oldest()
+        if solid_index:
+            zf.writestr(SOLID_INDEX_NAME, json.dumps(solid_index))
+
+    if not num_files:
+        print("No se encontraron archivos para respaldar.")
+    print(f"Archivo ZIP '{output_zip_path}' creado exitosamente con {num_files} archivos.")
     return output_zip_path
 
+# --- Formato tar.zst ---
+
+def _gcm_key(password, salt, log_n, r, p):
+    """ Deriva la clave AES-256 de la contraseña con scrypt (OpenSSL vía hashlib). """
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=1 << log_n, r=r, p=p,
+                          maxmem=256 * 1024 * 1024, dklen=32)
+
+def _gcm_nonce(prefix, counter, last):
+    """ Nonce de 12 bytes: prefijo aleatorio, contador de bloque y marca de último bloque. """
+    return prefix + counter.to_bytes(4, 'big') + (b'\x01' if last else b'\x00')
+
+class _GCMChunkWriter:
+    """
+    Archivo de solo escritura que cifra con AES-256-GCM en bloques de tamaño fijo.
+    El último bloque (posiblemente vacío) se marca en el nonce para detectar truncados.
+    """
+    def __init__(self, fileobj, password):
+        salt, self._prefix = os.urandom(16), os.urandom(7)
+        self._header = _GCM_MAGIC + _GCM_HEADER.pack(
+            _GCM_VERSION, _SCRYPT_LOG_N, _SCRYPT_R, _SCRYPT_P, _GCM_CHUNK_SIZE, salt, self._prefix)
+        self._aead = AESGCM(_gcm_key(password, salt, _SCRYPT_LOG_N, _SCRYPT_R, _SCRYPT_P))
+        self._fileobj = fileobj
+        self._buffer = bytearray()
+        self._counter = 0
+        self.closed = False
+        fileobj.write(self._header)
+
+    def _seal(self, data, last):
+        nonce = _gcm_nonce(self._prefix, self._counter, last)
+        self._fileobj.write(self._aead.encrypt(nonce, bytes(data), self._header))
+        self._counter += 1
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= _GCM_CHUNK_SIZE:
+            view = memoryview(self._buffer)
+            full = len(self._buffer) - len(self._buffer) % _GCM_CHUNK_SIZE
+            for start in range(0, full, _GCM_CHUNK_SIZE):
+                self._seal(view[start:start + _GCM_CHUNK_SIZE], last=False)
+            view.release()
+            del self._buffer[:full]
+        return len(data)
+
+    def flush(self):
+        self._fileobj.flush()
+
+    def close(self):
+        if not self.closed:
+            self._seal(self._buffer, last=True)
+            self._buffer = bytearray()
+            self._fileobj.flush()
+            self.closed = True
+
+class _GCMChunkReader:
+    """ Contraparte de _GCMChunkWriter: descifra y verifica bloque a bloque. """
+    def __init__(self, fileobj, password):
+        self._fileobj = fileobj
+        header = fileobj.read(len(_GCM_MAGIC) + _GCM_HEADER.size)
+        if len(header) != len(_GCM_MAGIC) + _GCM_HEADER.size or not header.startswith(_GCM_MAGIC):
+            raise ValueError("Archivo cifrado inválido o corrupto.")
+        version, log_n, r, p, chunk_size, salt, self._prefix = _GCM_HEADER.unpack_from(
+            header, len(_GCM_MAGIC))
+        if version != _GCM_VERSION:
+            raise ValueError(f"Versión de cifrado no soportada: {version}.")
+        self._header = header
+        self._aead = AESGCM(_gcm_key(password, salt, log_n, r, p))
+        self._sealed_size = chunk_size + _GCM_TAG_SIZE
+        self._next_sealed = fileobj.read(self._sealed_size)
+        self._buffer = b''
+        self._offset = 0
+        self._counter = 0
+        self._eof = False
+
+    def _open_next(self):
+        sealed = self._next_sealed
+        # Leer el siguiente bloque por adelantado para saber si este es el último
+        self._next_sealed = self._fileobj.read(self._sealed_size)
+        last = not self._next_sealed
+        try:
+            self._buffer = self._aead.decrypt(
+                _gcm_nonce(self._prefix, self._counter, last), sealed, self._header)
+        except InvalidTag as e:
+            raise ValueError("Contraseña incorrecta o archivo corrupto.") from e
+        self._offset = 0
+        self._counter += 1
+        self._eof = last
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        parts = []
+        while size < 0 or size > 0:
+            if self._offset == len(self._buffer):
+                if self._eof:
+                    break
+                self._open_next()
+                continue
+            end = len(self._buffer) if size < 0 else min(len(self._buffer), self._offset + size)
+            parts.append(self._buffer[self._offset:end])
+            if size > 0:
+                size -= end - self._offset
+            self._offset = end
+        return b''.join(parts)
+
+def _require_zst(password):
+    if not ZSTD_AVAILABLE:
+        raise EnvironmentError("El formato zst requiere el paquete 'zstandard' (pip install zstandard).")
+    if password and not AESGCM_AVAILABLE:
+        raise EnvironmentError("El cifrado del formato zst requiere el paquete 'cryptography' (pip install cryptography).")
+
+def create_tar_zst_archive(source_folders, output_path, password=None):
+    """
+    Crea un tar.zst en streaming (zstd nivel 3, ventana larga, hilos propios de zstd),
+    opcionalmente cifrado con AES-256-GCM por bloques con clave derivada por scrypt.
+    """
+    _require_zst(password)
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_dir, exist_ok=True)
+
+    print(f"Creando archivo tar.zst en {output_path}...")
+    params = zstd.ZstdCompressionParameters.from_level(
+        ZSTD_LEVEL, window_log=ZSTD_WINDOW_LOG, enable_ldm=True, threads=-1)
+    cctx = zstd.ZstdCompressor(compression_params=params)
+    num_files = 0
+
+    with open(output_path, 'wb') as out_fp:
+        sink = _GCMChunkWriter(out_fp, password) if password else out_fp
+        with cctx.stream_writer(sink, closefd=False) as compressor:
+            with tarfile.open(fileobj=compressor, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+                tar.copybufsize = STREAM_CHUNK_SIZE
+                for filepath, arcname, st in iter_files(source_folders):
+                    tarinfo = tarfile.TarInfo(arcname)
+                    tarinfo.size = st.st_size
+                    tarinfo.mtime = int(st.st_mtime)
+                    tarinfo.mode = st.st_mode & 0o7777
+                    with open(filepath, 'rb') as f:
+                        tar.addfile(tarinfo, f)
+                    num_files += 1
+        if password:
+            sink.close()
+
+    if not num_files:
+        print("No se encontraron archivos para respaldar.")
+    print(f"Archivo tar.zst '{output_path}' creado exitosamente con {num_files} archivos.")
+    return output_path
+
+def _detect_tar_zst(backup_path):
+    """ Devuelve (es_tar_zst, cifrado) según la firma del archivo. """
+    with open(backup_path, 'rb') as f:
+        head = f.read(len(_GCM_MAGIC))
+    if head.startswith(_GCM_MAGIC):
+        return True, True
+    return head.startswith(_ZSTD_MAGIC), False
+
+def restore_from_tar_zst(backup_path, restore_to_path, password=None, encrypted=False):
+    """ Restaura un tar.zst (cifrado o no) con el filtro 'data' de tarfile. """
+    if encrypted and not password:
+        raise ValueError("El backup está cifrado; se requiere --password.")
+    _require_zst(password if encrypted else None)
+
+    print(f"Restaurando {backup_path} (tar.zst) a {restore_to_path}...")
+    os.makedirs(restore_to_path, exist_ok=True)
+    dctx = zstd.ZstdDecompressor(max_window_size=1 << ZSTD_WINDOW_LOG)
+    try:
+        with open(backup_path, 'rb') as in_fp:
+            source = _GCMChunkReader(in_fp, password) if encrypted else in_fp
+            with dctx.stream_reader(source, read_size=STREAM_CHUNK_SIZE, closefd=False) as reader:
+                with tarfile.open(fileobj=reader, mode='r|') as tar:
+                    tar.extractall(restore_to_path, filter='data')
+    except (tarfile.TarError, zstd.ZstdError) as e:
+        raise ValueError(f"Archivo tar.zst inválido o corrupto: {e}") from e
+    print("Restauración completada.")
+
 # --- Paralelización en la restauración (extracción) ---
-@dask.delayed
-def extract_single_member(zip_filepath, member_name, target_path, password_bytes):
+class _ThreadLocalZipReader:
     """
-    Tarea Dask para extraer un único miembro de un archivo ZIP.
-    Cada tarea abre el ZIP, establece la contraseña y extrae un archivo.
+    Mantiene un BackupZipFile abierto por hilo del pool de extracción: cada hilo configura
+    la contraseña una sola vez, no una vez por miembro, y todos reutilizan el directorio
+    central ya parseado (`central_directory`) en lugar de leerlo de nuevo.
     """
+
+    def __init__(self, zip_filepath, password_bytes, central_directory=None):
+        self.zip_filepath = zip_filepath
+        self.password_bytes = password_bytes
+        self.central_directory = central_directory
+        self._local = threading.local()
+        self._handles = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        zf = getattr(self._local, 'zf', None)
+        if zf is None:
+            zf = BackupZipFile(self.zip_filepath, 'r', central_directory=self.central_directory)
+            if self.password_bytes:
+                zf.setpassword(self.password_bytes)
+            self._local.zf = zf
+            with self._lock:
+                self._handles.append(zf)
+        return zf
+
+    def close(self):
+        with self._lock:
+            for zf in self._handles:
+                zf.close()
+            self._handles.clear()
+
+
+def _uring_supported():
+    """ io_uring con IORING_OP_READ/WRITE/CLOSE necesita liburing y un kernel >= 5.6. """
+    if not URING_AVAILABLE:
+        return False
     try:
-        with pyzipper.AESZipFile(zip_filepath, 'r') as zf_worker:
-            if password_bytes:
-                zf_worker.setpassword(password_bytes)
-            zf_worker.extract(member_name, path=target_path)
-        return member_name, True
+        version = tuple(int(part) for part in os.uname().release.split('-')[0].split('.')[:2])
+    except ValueError:
+        return False
+    return version >= URING_MIN_KERNEL
+
+class _UringFileWriter:
+    """
+    Escribe archivos completos con io_uring: por cada archivo se encolan un write y un
+    close enlazados (IOSQE_IO_LINK), y el hilo sigue descomprimiendo el siguiente
+    miembro mientras el kernel persiste los anteriores. Un ring por hilo (no es thread-safe).
+    """
+
+    def __init__(self):
+        self._ring = Ring()
+        self._cqe = Cqe()
+        io_uring_queue_init(2 * URING_QUEUE_DEPTH, self._ring)
+        self._pending = {} # id -> [nombre, fd, datos, operaciones sin completar, error]
+        self._inflight_bytes = 0
+        self._next_id = 0
+        self._failed = []
+
+    def submit(self, name, fd, data):
+        """ Encola la escritura de `data` en `fd` (recién abierto) y su cierre. """
+        while self._pending and (len(self._pending) >= URING_QUEUE_DEPTH
+                                 or self._inflight_bytes + len(data) > URING_MAX_INFLIGHT_BYTES):
+            self._reap_one()
+        file_id = self._next_id
+        self._next_id += 1
+        sqe = io_uring_get_sqe(self._ring)
+        io_uring_prep_write(sqe, fd, data, 0)
+        io_uring_sqe_set_data64(sqe, 2 * file_id)
+        io_uring_sqe_set_flags(sqe, IOSQE_IO_LINK)
+        sqe = io_uring_get_sqe(self._ring)
+        io_uring_prep_close(sqe, fd)
+        io_uring_sqe_set_data64(sqe, 2 * file_id + 1)
+        self._pending[file_id] = [name, fd, data, 2, None]
+        self._inflight_bytes += len(data)
+        io_uring_submit(self._ring)
+
+    def _reap_one(self):
+        io_uring_wait_cqe(self._ring, self._cqe)
+        cqe = self._cqe[0]
+        user_data = cqe.user_data
+        try:
+            res = cqe.res
+        except OSError as e: # La extensión expone los resultados negativos como OSError
+            res = -e.errno
+        io_uring_cq_advance(self._ring, 1)
+
+        file_id, is_close = divmod(user_data, 2)
+        entry = self._pending[file_id]
+        name, fd, data = entry[0], entry[1], entry[2]
+        if not is_close:
+            if res == -errno.EINVAL:
+                # Operación no soportada por el kernel: se escribe de forma síncrona
+                # (el close enlazado se cancela y el fd sigue abierto)
+                try:
+                    _write_all(fd, memoryview(data))
+                except OSError as e:
+                    entry[4] = e
+            elif res < 0:
+                entry[4] = OSError(-res, os.strerror(-res))
+            elif res < len(data):
+                # Escritura corta: el close enlazado se cancela y se termina aquí. El write
+                # se encoló con offset explícito y no movió la posición del fd: pwrite
+                try:
+                    _pwrite_all(fd, memoryview(data)[res:], res)
+                except OSError as e:
+                    entry[4] = e
+        elif res < 0:
+            if res == -errno.ECANCELED:
+                os.close(fd) # El write falló o fue corto; el close quedó cancelado
+            elif entry[4] is None:
+                entry[4] = OSError(-res, os.strerror(-res))
+        entry[3] -= 1
+        if not entry[3]:
+            del self._pending[file_id]
+            self._inflight_bytes -= len(data)
+            if entry[4] is not None:
+                self._failed.append((name, entry[4]))
+
+    def drain(self):
+        """ Espera las escrituras pendientes. Devuelve [(nombre, error)] de las fallidas. """
+        while self._pending:
+            self._reap_one()
+        failed, self._failed = self._failed, []
+        return failed
+
+    def close(self):
+        self.drain()
+        io_uring_queue_exit(self._ring)
+
+
+class _ErrorReporter:
+    """
+    Recoge los errores de las tareas de extracción en una cola acotada que vacía un único
+    hilo, de modo que los workers no compiten por stdout. Si la cola se llena, el error
+    se cuenta pero no se muestra.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=ERROR_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self.count = 0 # Archivos fallidos
+        self._dropped = 0
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def report(self, name, error, count=1):
+        with self._lock:
+            self.count += count
+        try:
+            self._queue.put_nowait((name, error))
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+
+    def _drain(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            logger.warning("Error extrayendo %s: %s", *item)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._dropped:
+            logger.warning("%d errores más no se mostraron.", self._dropped)
+
+
+class _ThreadLocalUringWriter:
+    """ Un _UringFileWriter por hilo del pool de extracción; None si io_uring no está disponible. """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._writers = []
+        self._lock = threading.Lock()
+        self._disabled = not _uring_supported()
+
+    def get(self):
+        if self._disabled:
+            return None
+        writer = getattr(self._local, 'writer', None)
+        if writer is None:
+            try:
+                writer = _UringFileWriter()
+            except OSError as e: # Kernel sin io_uring o bloqueado (p. ej. seccomp en contenedores)
+                print(f"Advertencia: io_uring no disponible ({e}); se usa escritura síncrona.")
+                self._disabled = True
+                return None
+            self._local.writer = writer
+            with self._lock:
+                self._writers.append(writer)
+        return writer
+
+    def close(self):
+        with self._lock:
+            for writer in self._writers:
+                writer.close()
+            self._writers.clear()
+
+
+def _sanitize_member_path(member_name):
+    """
+    Ruta relativa segura para un miembro, como la calcula zipfile al extraer:
+    sin unidad, raíz, '.' ni '..', para que nada se escriba fuera del destino.
+    """
+    arcname = member_name.replace('/', os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    invalid_path_parts = ('', os.path.curdir, os.path.pardir)
+    return os.path.sep.join(x for x in arcname.split(os.path.sep) if x not in invalid_path_parts)
+
+def _write_new_file(fd, data, name, writer):
+    """ Escribe `data` en un archivo recién abierto y lo cierra, vía io_uring si hay writer. """
+    if writer is None:
+        try:
+            _write_all(fd, data)
+        finally:
+            os.close(fd)
+        return
+    try:
+        writer.submit(name, fd, data)
+    except BaseException:
+        os.close(fd)
+        raise
+
+def _write_member(zf, member_name, filename, dir_fd, writer=None):
+    """
+    Descomprime un miembro y lo escribe en `filename` (relativo a dir_fd si se da).
+    Con `writer` la escritura de los miembros que se leen enteros queda en vuelo en io_uring.
+    """
+    zinfo = zf.getinfo(member_name)
+    with zf.open(zinfo) as src:
+        fd = os.open(filename, _RESTORE_OPEN_FLAGS, 0o666, dir_fd=dir_fd)
+        if zinfo.file_size <= RESTORE_READ_ALL_MAX:
+            try:
+                data = src.read()
+            except BaseException:
+                os.close(fd)
+                raise
+            _write_new_file(fd, data, member_name, writer)
+            return
+        try:
+            while True:
+                chunk = src.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                _write_all(fd, chunk)
+        finally:
+            os.close(fd)
+
+def _drain_writes(writer, errors):
+    """ Espera las escrituras en vuelo del writer y reporta las fallidas. Devuelve cuántas fallaron. """
+    if writer is None:
+        return 0
+    failed = writer.drain()
+    for name, error in failed:
+        errors.report(name, error)
+    return len(failed)
+
+def extract_member_group(reader, target_dir, members, errors, writers=None):
+    """
+    Extrae, con el handle del hilo actual, miembros que comparten directorio destino.
+    El directorio se abre una vez y cada archivo se crea relativo a él.
+    `members` son pares (nombre en el ZIP, nombre de archivo). Devuelve cuántos se
+    extrajeron; los fallos se envían a `errors`.
+    """
+    zf = reader.get()
+    writer = writers.get() if writers else None
+    dir_fd = os.open(target_dir, os.O_RDONLY | os.O_DIRECTORY) if _DIR_FD_SUPPORTED else None
+    num_extracted = 0
+    try:
+        for member_name, filename in members:
+            try:
+                if dir_fd is None:
+                    filename = os.path.join(target_dir, filename)
+                _write_member(zf, member_name, filename, dir_fd, writer)
+                num_extracted += 1
+            except Exception as e:
+                errors.report(member_name, e)
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
+    return num_extracted - _drain_writes(writer, errors)
+
+
+def extract_solid_block(reader, restore_to_path, block_name, arcnames, errors, writers=None):
+    """
+    Extrae los archivos de un bloque tar del modo sólido, leyéndolo en streaming.
+    Como con los miembros sueltos, solo se escribe el contenido y las rutas se sanean;
+    los directorios ya existen (se crean desde el índice). Devuelve cuántos se extrajeron.
+    """
+    writer = writers.get() if writers else None
+    num_extracted = num_attempted = 0
+    try:
+        with reader.get().open(block_name) as src:
+            with tarfile.open(fileobj=src, mode='r|') as tar:
+                for tarinfo in tar:
+                    if not tarinfo.isfile():
+                        continue
+                    num_attempted += 1
+                    relative_path = _sanitize_member_path(tarinfo.name)
+                    try:
+                        data = tar.extractfile(tarinfo).read()
+                        fd = os.open(os.path.join(restore_to_path, relative_path), _RESTORE_OPEN_FLAGS, 0o666)
+                        _write_new_file(fd, data, tarinfo.name, writer)
+                        num_extracted += 1
+                    except OSError as e:
+                        errors.report(tarinfo.name, e)
     except Exception as e:
-        print(f"Error extrayendo {member_name}: {e}")
-        return member_name, False
+        # Los archivos que quedaban en el bloque cuentan como fallidos
+        errors.report(f"el bloque {block_name}", e, count=max(len(arcnames) - num_attempted, 1))
+    return num_extracted - _drain_writes(writer, errors)
 
 
 def restore_from_archive(backup_zip_path, restore_to_path, password=None):
     """
     Restaura desde un archivo ZIP, opcionalmente desencriptando.
-    Utiliza Dask para paralelizar la extracción de archivos individuales.
+    La extracción de archivos individuales se reparte en un pool de hilos.
+    Los backups tar.zst se detectan por su firma y se restauran en streaming.
     """
     if not os.path.exists(backup_zip_path):
         raise FileNotFoundError(f"El archivo de backup {backup_zip_path} no fue encontrado.")
+
+    is_tar_zst, encrypted = _detect_tar_zst(backup_zip_path)
+    if is_tar_zst:
+        return restore_from_tar_zst(backup_zip_path, restore_to_path, password, encrypted)
     
     print(f"Restaurando {backup_zip_path} a {restore_to_path}...")
     os.makedirs(restore_to_path, exist_ok=True)
 
     password_bytes = password.encode('utf-8') if password else None
-    delayed_extract_tasks = []
+    members_by_dir = {} # directorio destino -> [(miembro, nombre de archivo)]
+    solid_index = {} # bloque tar del modo sólido -> archivos que contiene
+    target_dirs = set() # directorios a crear, una vez cada uno
+    num_members_to_extract = 0
 
     try:
         # Abrir el ZIP una vez para obtener la lista de miembros y probar la contraseña
-        with pyzipper.AESZipFile(backup_zip_path, 'r') as zf_main:
+        with BackupZipFile(backup_zip_path, 'r') as zf_main:
+            central_directory = zf_main.infolist() # Se parsea una vez y lo comparten los hilos
             if password_bytes:
                 zf_main.setpassword(password_bytes)
                 try:
@@ -119,29 +1216,65 @@ def restore_from_archive(backup_zip_path, restore_to_path, password=None):
                 return
 
             print(f"Se encontraron {len(member_list)} miembros en el ZIP. Preparando extracción paralela...")
+            if SOLID_INDEX_NAME in member_list:
+                try:
+                    solid_index = json.loads(zf_main.read(SOLID_INDEX_NAME))
+                except RuntimeError as e: # Índice encriptado sin contraseña o con una incorrecta
+                    raise ValueError("Contraseña incorrecta o archivo corrupto.") from e
+                for arcnames in solid_index.values():
+                    for arcname in arcnames:
+                        relative_path = _sanitize_member_path(arcname)
+                        target_dirs.add(os.path.dirname(os.path.join(restore_to_path, relative_path)))
+                    num_members_to_extract += len(arcnames)
+
             for member in member_list:
-                member_path = os.path.join(restore_to_path, member)
+                if member == SOLID_INDEX_NAME or member in solid_index:
+                    continue
+                relative_path = _sanitize_member_path(member)
+                if not relative_path:
+                    continue
+                member_path = os.path.join(restore_to_path, relative_path)
                 if member.endswith('/'): # Es un directorio explícito en el ZIP
-                    os.makedirs(member_path, exist_ok=True)
+                    target_dirs.add(member_path)
                 else: # Es un archivo
-                    member_dir = os.path.dirname(member_path)
-                    if member_dir: # Asegurar que el directorio del archivo exista
-                         os.makedirs(member_dir, exist_ok=True)
-                
-                delayed_extract_tasks.append(
-                    extract_single_member(backup_zip_path, member, restore_to_path, password_bytes)
-                )
+                    member_dir, filename = os.path.split(member_path)
+                    members_by_dir.setdefault(member_dir, []).append((member, filename))
+                    num_members_to_extract += 1
+
+            # Un makedirs por directorio único (no por miembro); en orden, los padres primero
+            target_dirs.update(members_by_dir)
+            for target_dir in sorted(target_dirs):
+                os.makedirs(target_dir, exist_ok=True)
         
-        if delayed_extract_tasks:
-            print(f"Ejecutando {len(delayed_extract_tasks)} tareas de extracción con Dask...")
-            with ProgressBar():
-                results = dask.compute(*delayed_extract_tasks, scheduler='threads') 
+        if members_by_dir or solid_index:
+            print(f"Extrayendo {num_members_to_extract} miembros en paralelo...")
+            reader = _ThreadLocalZipReader(backup_zip_path, password_bytes, central_directory)
+            writers = _ThreadLocalUringWriter()
+            errors = _ErrorReporter()
+            # Directorios muy poblados se reparten en varios grupos para no serializarlos
+            tasks = [
+                functools.partial(extract_member_group, reader, member_dir,
+                                  members[i:i + RESTORE_GROUP_SIZE], errors, writers)
+                for member_dir, members in members_by_dir.items()
+                for i in range(0, len(members), RESTORE_GROUP_SIZE)
+            ]
+            tasks.extend(
+                functools.partial(extract_solid_block, reader, restore_to_path, block_name, arcnames,
+                                  errors, writers)
+                for block_name, arcnames in solid_index.items()
+            )
+            try:
+                num_extracted = sum(_IO_POOL.map(lambda task: task(), tasks))
+            finally:
+                writers.close()
+                reader.close()
+                errors.close()
             
-            num_failed = sum(1 for _, success in results if not success)
+            num_failed = errors.count
             if num_failed > 0:
                 print(f"Advertencia: {num_failed} archivos no pudieron ser extraídos.")
             else:
-                print("Todos los archivos extraídos exitosamente.")
+                print(f"Todos los archivos extraídos exitosamente ({num_extracted}).")
         else:
             print("No hay archivos para extraer (solo directorios o ZIP vacío).")
 
@@ -153,40 +1286,39 @@ def restore_from_archive(backup_zip_path, restore_to_path, password=None):
         print(f"Excepción durante la restauración: {e}")
         raise
 
-@dask.delayed
-def write_fragment(data_chunk, fragment_path):
-    # print(f"Dask: Escribiendo fragmento {os.path.basename(fragment_path)}")
+def write_fragment(source_path, offset, length, fragment_path):
+    """ Tarea del pool de E/S: copia el rango [offset, offset+length) del archivo a un fragmento. """
     try:
-        with open(fragment_path, 'wb') as f_frag:
-            f_frag.write(data_chunk)
+        with open(source_path, 'rb') as f_in, open(fragment_path, 'wb') as f_frag:
+            copied = _copy_range(f_in.fileno(), f_frag.fileno(), offset, length)
+        if copied != length:
+            raise IOError(f"se copiaron {copied} de {length} bytes")
         return fragment_path, True
     except Exception as e:
         print(f"Error escribiendo fragmento {fragment_path}: {e}")
         return fragment_path, False # Indicar fallo
 
 def split_file(large_file_path, fragments_dir_local, fragment_size_bytes):
-    """ Divide un archivo grande en fragmentos usando Dask para escrituras paralelas. """
+    """
+    Divide un archivo grande en fragmentos, escritos en paralelo por el pool de E/S.
+    Cada tarea copia su rango en el kernel; los datos no se cargan en memoria.
+    """
     if not os.path.exists(large_file_path):
         raise FileNotFoundError(f"Archivo a fragmentar no encontrado: {large_file_path}")
     
     os.makedirs(fragments_dir_local, exist_ok=True)
     base_filename = os.path.basename(large_file_path)
-    file_number = 0
+    total_size = os.path.getsize(large_file_path)
     tasks = []
 
-    with open(large_file_path, 'rb') as f_in:
-        while True:
-            chunk = f_in.read(fragment_size_bytes)
-            if not chunk:
-                break
-            file_number += 1
-            fragment_path = os.path.join(fragments_dir_local, f"{base_filename}.part{file_number:03d}")
-            tasks.append(write_fragment(chunk, fragment_path))
+    for file_number, offset in enumerate(range(0, total_size, fragment_size_bytes), start=1):
+        fragment_path = os.path.join(fragments_dir_local, f"{base_filename}.part{file_number:03d}")
+        length = min(fragment_size_bytes, total_size - offset)
+        tasks.append((large_file_path, offset, length, fragment_path))
     
     if tasks:
-        print(f"Procesando {len(tasks)} fragmentos con Dask para escritura...")
-        with ProgressBar():
-            results = dask.compute(*tasks, scheduler='threads')
+        print(f"Procesando {len(tasks)} fragmentos en paralelo para escritura...")
+        results = list(_IO_POOL.map(lambda task: write_fragment(*task), tasks))
         
         num_failed = sum(1 for _, success in results if not success)
         if num_failed > 0:
@@ -199,6 +1331,7 @@ def split_file(large_file_path, fragments_dir_local, fragment_size_bytes):
 def merge_files(fragments_source_dir, base_filename_with_ext, output_file_path):
     """
     Une fragmentos para recrear el archivo original.
+    El destino se preasigna completo y cada fragmento se copia en el kernel.
     """
     if not os.path.isdir(fragments_source_dir):
         raise FileNotFoundError(f"Directorio de fragmentos no encontrado: {fragments_source_dir}")
@@ -215,12 +1348,17 @@ def merge_files(fragments_source_dir, base_filename_with_ext, output_file_path):
     print(f"Uniendo {len(fragment_paths)} fragmentos en {output_file_path}...")
     os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
 
-    # La unión es secuencial. Paralelizar la lectura de fragmentos y encolarlos
+    fragment_sizes = [os.path.getsize(p) for p in fragment_paths]
+
+    # La unión es secuencial; el cuello de botella es el dispositivo, no Python
     with open(output_file_path, 'wb') as f_out:
-        for frag_path in fragment_paths:
+        _preallocate(f_out.fileno(), sum(fragment_sizes))
+        for frag_path, frag_size in zip(fragment_paths, fragment_sizes):
             try:
                 with open(frag_path, 'rb') as f_in:
-                    shutil.copyfileobj(f_in, f_out)
+                    copied = _copy_range(f_in.fileno(), f_out.fileno(), 0, frag_size)
+                if copied != frag_size:
+                    raise IOError(f"se leyeron {copied} de {frag_size} bytes")
             except Exception as e:
                 raise IOError(f"Error leyendo el fragmento {frag_path}: {e}")
     print(f"Archivo '{output_file_path}' unido exitosamente.")
\ No newline at end of file
@@ -2,31 +2,19 @@ import click
 import os
 import sys
 import shutil
-import logging # Para silenciar logs de Dask
 from backup_processing import (
     create_backup_archive,
     restore_from_archive,
     split_file,
     merge_files
 )
-from storage_backends import (
-    copy_to_local_disk,
-    upload_to_google_drive,
-    copy_fragments_to_usb,
-    download_from_google_drive
-)
-from dask.distributed import Client, LocalCluster
-
-dask_client = None
-dask_cluster = None
-# ------------------------------------------
 
 DEFAULT_COMPRESSION_ALGORITHM = 'zip'
 
 @click.group()
 def cli():
     """
-    Sistema de Respaldo con Dask.
+    Sistema de Respaldo con compresión en paralelo.
     Permite respaldar y restaurar carpetas, con opciones de compresión,
     encriptación y múltiples destinos de almacenamiento.
     """
@@ -37,22 +25,33 @@ def cli():
               type=click.Path(exists=True, file_okay=False, readable=True, resolve_path=True),
               help="Carpetas a respaldar (se pueden especificar múltiples veces).")
 @click.option('--output-name', '-o', required=True,
-              help="Nombre base para el archivo de backup (ej. 'mi_backup'). La extensión .zip se añadirá.")
+              help="Nombre base para el archivo de backup (ej. 'mi_backup'). La extensión .zip o .tar.zst se añadirá.")
 @click.option('--temp-dir', default='./backup_temp', type=click.Path(file_okay=False, resolve_path=True),
               help="Directorio temporal para generar el backup antes de moverlo.")
-@click.option('--compress', default=DEFAULT_COMPRESSION_ALGORITHM,
-              type=click.Choice(['zip']), 
-              help="Algoritmo de compresión.")
-@click.option('--encrypt', is_flag=True, help="Encriptar el archivo de backup (AES-256 para ZIP).")
+@click.option('--compress', '--format', 'compress', default=DEFAULT_COMPRESSION_ALGORITHM,
+              type=click.Choice(['zip', 'zst']), 
+              help="Formato del backup: 'zip' (DEFLATE) o 'zst' (tar.zst, más rápido).")
+@click.option('--encrypt', is_flag=True, help="Encriptar el archivo de backup (AES-256 para ZIP, AES-256-GCM para zst).")
 @click.option('--password', help="Contraseña para encriptación. Requerido si --encrypt está activo.")
+@click.option('--solid', is_flag=True,
+              help="Agrupar archivos pequeños en bloques comprimidos juntos (mejor ratio, solo ZIP).")
 @click.option('--storage-type', type=click.Choice(['local', 'gdrive', 'usb']), default='local',
               help="Tipo de almacenamiento para el backup.")
 @click.option('--storage-path', required=True,
               help="Ruta para 'local'/'usb' (ej. /mnt/externo) o ID de carpeta para 'gdrive'.")
 @click.option('--fragment-size', type=int, default=0,
               help="Tamaño de fragmento en MB para USB (0 para no fragmentar).")
-def backup(sources, output_name, temp_dir, compress, encrypt, password, storage_type, storage_path, fragment_size):
+def backup(sources, output_name, temp_dir, compress, encrypt, password, solid, storage_type, storage_path, fragment_size):
     """Crea un nuevo respaldo."""
+    # storage_backends (y con él las librerías de Google) se importa aquí y no al inicio del
+    # script: los workers del forkserver vuelven a ejecutar main.py como __mp_main__ y no
+    # deben pagar esa importación ni repetir sus avisos.
+    from storage_backends import (
+        copy_to_local_disk,
+        upload_to_google_drive,
+        copy_fragments_to_usb,
+        start_token_refresher
+    )
     if encrypt and not password:
         click.echo("Error: La contraseña es requerida para encriptación (--password).", err=True)
         sys.exit(1)
@@ -61,9 +60,12 @@ def backup(sources, output_name, temp_dir, compress, encrypt, password, storage_
         click.echo("Error: Se requiere --storage-path (ID de carpeta de Google Drive) para 'gdrive'.", err=True)
         sys.exit(1)
 
+    if storage_type == 'gdrive':
+        start_token_refresher() # El token se mantiene vigente mientras se crea el backup
+
     # Asegurar que el directorio temporal exista
     os.makedirs(temp_dir, exist_ok=True)
-    backup_filename = f"{output_name}.zip"
+    backup_filename = f"{output_name}.tar.zst" if compress == 'zst' else f"{output_name}.zip"
     local_temp_backup_path = os.path.join(temp_dir, backup_filename)
 
     click.echo(f"Iniciando respaldo de: {', '.join(sources)}")
@@ -72,7 +74,8 @@ def backup(sources, output_name, temp_dir, compress, encrypt, password, storage_
     try:
         create_backup_archive(list(sources), local_temp_backup_path,
                               compress_type=compress,
-                              password=password if encrypt else None)
+                              password=password if encrypt else None,
+                              solid=solid)
         click.echo(f"Backup temporal creado en: {local_temp_backup_path}")
 
         file_to_store = local_temp_backup_path
@@ -93,7 +96,7 @@ def backup(sources, output_name, temp_dir, compress, encrypt, password, storage_
         
         elif storage_type == 'gdrive':
             upload_to_google_drive(file_to_store, storage_path, backup_filename)
-            click.echo(f"Backup subido a Google Drive (carpeta ID: {storage_path}) como {backup_filename}.")
+            click.echo(f"Backup almacenado en Google Drive (carpeta ID: {storage_path}) como {backup_filename}.")
 
         elif storage_type == 'usb':
             if fragments_dir_local: 
@@ -131,6 +134,7 @@ def backup(sources, output_name, temp_dir, compress, encrypt, password, storage_
               help="Indica si el backup está fragmentado (relevante para 'usb' o 'local' si se almacenaron fragmentos).")
 def restore(source_type, source_path, backup_filename, restore_to, temp_dir, password, is_fragmented):
     """Restaura archivos desde un backup."""
+    from storage_backends import download_from_google_drive
     os.makedirs(restore_to, exist_ok=True)
     os.makedirs(temp_dir, exist_ok=True)
     
@@ -165,7 +169,9 @@ def restore(source_type, source_path, backup_filename, restore_to, temp_dir, pas
                 sys.exit(1)
 
             if is_fragmented:
-                usb_fragments_dir = os.path.join(source_path, f"{os.path.splitext(backup_filename)[0]}_fragments")
+                base_name = backup_filename[:-len('.tar.zst')] if backup_filename.endswith('.tar.zst') \
+                    else os.path.splitext(backup_filename)[0]
+                usb_fragments_dir = os.path.join(source_path, f"{base_name}_fragments")
                 click.echo(f"Uniendo fragmentos desde USB (directorio: {usb_fragments_dir}) para el archivo base {backup_filename}...")
                 local_backup_file_to_process = os.path.join(temp_dir, backup_filename)
                 merge_files(usb_fragments_dir, backup_filename, local_backup_file_to_process)
@@ -198,15 +204,8 @@ def restore(source_type, source_path, backup_filename, restore_to, temp_dir, pas
 
 
 if __name__ == '__main__':
-    try:        
-        num_workers = os.cpu_count() # Usar todos los cores disponibles
-        print(f"Iniciando Dask LocalCluster con {num_workers} workers...")
-        dask_cluster = LocalCluster(n_workers=num_workers, threads_per_worker=1) # 1 hilo por worker, procesos separados
-        dask_client = Client(dask_cluster)
-        print(f"Dask Client conectado: {dask_client}")
-        print(f"Dask dashboard link: {dask_client.dashboard_link}")
-        # ---------------------------------------
-        
+    try:
+        # El paralelismo lo aportan los pools de backup_processing; no hace falta un cluster
         cli() # Ejecutar la interfaz de línea de comandos
 
     except KeyboardInterrupt:
@@ -217,19 +216,3 @@ if __name__ == '__main__':
         import traceback
         traceback.print_exc()
         sys.exit(1)
-    finally:
-        # --- Cerrar Dask Client y LocalCluster ---
-        print("Cerrando Dask Client y LocalCluster...")
-        if dask_client:
-            try:
-                dask_client.close()
-                print("Cliente Dask cerrado.")
-            except Exception as e:
-                print(f"Error cerrando cliente Dask: {e}", file=sys.stderr)
-        if dask_cluster:
-            try:
-                dask_cluster.close()
-                print("Cluster Dask cerrado.")
-            except Exception as e:
-                print(f"Error cerrando cluster Dask: {e}", file=sys.stderr)
-        print("Limpieza de Dask completada.")
\ No newline at end of file
@@ -1,8 +1,15 @@
 import os
-import shutil
-import dask
-from dask.diagnostics import ProgressBar
+import sys
+import hashlib
+import logging
+import mmap
+import threading
+import time
+import datetime
 import io # Para MediaIoBaseDownload
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from backup_processing import _COPY_FALLBACK_ERRNOS, _copy_range, _preallocate, _uring_supported
 
 # Para Google Drive (requiere configuración de credenciales OAuth2)
 try:
@@ -10,12 +17,27 @@ try:
     from google.auth.transport.requests import Request
     from google_auth_oauthlib.flow import InstalledAppFlow
     from googleapiclient.discovery import build
-    from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
+    from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload, build_http
+    from google_auth_httplib2 import AuthorizedHttp
     GOOGLE_LIBS_AVAILABLE = True
 except ImportError:
     GOOGLE_LIBS_AVAILABLE = False
     print("Advertencia: Bibliotecas de Google no encontradas. Funcionalidad de Google Drive no disponible.")
-    print("Instale con: pip install google-api-python-client google-auth-httplib2 google-auth-oauthlib")
+    print("Instale con: pip install 'google-api-python-client>=2.0' google-auth-httplib2 google-auth-oauthlib")
+
+# io_uring (liburing, solo Linux, kernel >= 5.6: ver backup_processing._uring_supported)
+# para copiar los fragmentos a USB; sin él se usa el pool de hilos con _fast_copy.
+try:
+    if not sys.platform.startswith('linux'):
+        raise ImportError("io_uring solo existe en Linux")
+    from liburing import (Ring, Cqe, io_uring_queue_init, io_uring_queue_exit, io_uring_get_sqe,
+                          io_uring_prep_read, io_uring_prep_write, io_uring_sqe_set_data64,
+                          io_uring_submit, io_uring_wait_cqe, io_uring_cq_advance)
+    URING_AVAILABLE = True
+except ImportError:
+    URING_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
 
 
 # Rutas para credenciales de Google Drive (deben estar en el mismo directorio o ser configurables)
@@ -23,11 +45,77 @@ SCOPES = ['https://www.googleapis.com/auth/drive']
 TOKEN_PATH = 'token.json' 
 CREDS_PATH = 'credentials.json' 
 
-def get_gdrive_service():
-    if not GOOGLE_LIBS_AVAILABLE:
-        return None
-    creds = None
-    if os.path.exists(TOKEN_PATH):
+# Subidas a Google Drive: trozos grandes (menos round-trips por GB) y subida simple,
+# sin sesión reanudable, para archivos pequeños. Una sesión reanudable de Drive solo
+# acepta los trozos en orden (cada PUT continúa donde terminó el anterior), así que un
+# mismo archivo no se puede subir por rangos en paralelo: el tamaño del trozo es el ajuste.
+GDRIVE_UPLOAD_CHUNK = 32 * 1024 * 1024
+GDRIVE_SIMPLE_UPLOAD_MAX = 5 * 1024 * 1024
+
+# Descargas: trozos de 32 MiB; los archivos grandes se bajan por rangos en paralelo
+# (GET con cabecera Range) y cada rango se escribe con pwrite en su posición
+GDRIVE_DOWNLOAD_CHUNK = 32 * 1024 * 1024
+GDRIVE_PARALLEL_DOWNLOAD_MIN = 64 * 1024 * 1024
+GDRIVE_DOWNLOAD_WORKERS = 8
+GDRIVE_RANGE_RETRIES = 3
+# Rangos en vuelo por delante del que se está hasheando: el MD5 se calcula en orden,
+# así que acota la memoria retenida por rangos que terminaron antes de tiempo
+GDRIVE_DOWNLOAD_WINDOW = GDRIVE_DOWNLOAD_WORKERS + 2
+
+# Subidas simultáneas en upload_many_to_google_drive
+GDRIVE_UPLOAD_WORKERS = 4
+
+# Índice (nombre -> id, tamaño, md5) de las carpetas de Drive, cacheado unos segundos:
+# una búsqueda por nombre cuesta una consulta paginada por carpeta, no una por archivo
+GDRIVE_LIST_PAGE_SIZE = 1000
+GDRIVE_INDEX_TTL_SECONDS = 60
+GDRIVE_INDEX_CACHE_SIZE = 32
+_FOLDER_INDEX_CACHE = OrderedDict() # folder_id -> (momento de carga, índice)
+_FOLDER_INDEX_LOCK = threading.Lock()
+
+# Copias simultáneas a USB por dispositivo de destino (st_dev): en una sola memoria flash
+# más escrituras concurrentes provocan esperas del recolector del controlador, pero
+# dispositivos distintos se escriben en paralelo, cada uno con su propio pool
+USB_COPY_WORKERS_PER_DEVICE = 2
+
+# Copia a USB con io_uring: lecturas/escrituras de 1 MiB en vuelo entre todos los fragmentos
+URING_USB_QUEUE_DEPTH = 64
+URING_USB_BUFFER_SIZE = 1024 * 1024
+
+# Copias con O_DIRECT: buffer de 4 MiB, offsets y longitudes múltiplos de la alineación
+# (cubre bloques de 512 y 4096). El resto de métodos de copia es _copy_range.
+COPY_BUFFER_SIZE = 4 * 1024 * 1024
+DIRECT_IO_ALIGNMENT = 4096
+
+# Los workers solo cuentan tareas terminadas; un hilo repinta el progreso cada medio
+# segundo, y solo si la salida es una terminal y el lote dura más de PROGRESS_MIN_SECONDS
+PROGRESS_INTERVAL_SECONDS = 0.5
+PROGRESS_MIN_SECONDS = 1.0
+
+# Credenciales y servicio de Google Drive compartidos por todo el proceso
+_CREDS_CACHE = None
+_SERVICE_CACHE = None
+_SERVICE_LOCK = threading.Lock()
+# httplib2.Http no es thread-safe: una conexión keep-alive autenticada por hilo
+_HTTP_LOCAL = threading.local()
+GDRIVE_HTTP_TIMEOUT = 120
+
+# El token de acceso se refresca en segundo plano este margen antes de expirar
+TOKEN_REFRESH_MARGIN = datetime.timedelta(minutes=5)
+TOKEN_REFRESH_RETRY_SECONDS = 60
+_REFRESHER_THREAD = None
+_REFRESHER_LOCK = threading.Lock()
+
+def _save_token(creds):
+    with open(TOKEN_PATH, 'w') as token_file:
+        token_file.write(creds.to_json())
+
+def _load_creds(creds=None):
+    """
+    Devuelve credenciales válidas: reutiliza `creds` o las lee de token.json, las refresca
+    si expiraron y, como último recurso, lanza el flujo OAuth. None si no es posible.
+    """
+    if creds is None and os.path.exists(TOKEN_PATH):
         try:
             creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
         except Exception as e:
@@ -56,16 +144,224 @@ def get_gdrive_service():
                 print(f"Fallo en el flujo de autenticación de Google: {e}")
                 return None
 
-        with open(TOKEN_PATH, 'w') as token_file:
-            token_file.write(creds.to_json())
+        _save_token(creds)
         print("Token de Google Drive guardado/actualizado.")
-            
+    return creds
+
+def _load_token_in_background():
+    """
+    Carga token.json en _CREDS_CACHE si aún está vacío, sin flujo OAuth interactivo:
+    así el refresco ocurre mientras se crea el backup y no en la primera subida.
+    """
+    global _CREDS_CACHE
+    if not os.path.exists(TOKEN_PATH):
+        return
     try:
-        service = build('drive', 'v3', credentials=creds)
-        return service
-    except Exception as e:
-        print(f"Error creando servicio de Google Drive: {e}")
+        creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
+    except Exception:
+        return # Token ilegible: get_gdrive_service lo informará y re-autenticará
+    with _SERVICE_LOCK:
+        if _CREDS_CACHE is None:
+            _CREDS_CACHE = creds
+
+def _token_refresher_loop():
+    """ Refresca las credenciales cacheadas poco antes de que expiren, fuera del camino crítico. """
+    while True:
+        if _CREDS_CACHE is None:
+            _load_token_in_background()
+        creds = _CREDS_CACHE
+        if creds is None or not creds.refresh_token:
+            time.sleep(TOKEN_REFRESH_RETRY_SECONDS) # Aún no hay credenciales refrescables
+            continue
+        # google-auth guarda `expiry` como datetime UTC sin zona horaria; sin expiry
+        # (token recién leído sin access token vigente) se refresca ya
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        delay = (creds.expiry - TOKEN_REFRESH_MARGIN - now).total_seconds() if creds.expiry else 0
+        if creds.token and delay > 0:
+            time.sleep(delay)
+            continue
+        try:
+            with _SERVICE_LOCK:
+                creds.refresh(Request())
+                _save_token(creds)
+        except Exception as e:
+            print(f"Advertencia: No se pudo refrescar el token de Google Drive en segundo plano: {e}")
+            time.sleep(TOKEN_REFRESH_RETRY_SECONDS)
+
+def start_token_refresher():
+    """
+    Inicia (una sola vez) el hilo daemon que mantiene vigente el token de Google Drive.
+    Si aún no hay credenciales cacheadas, el hilo lee token.json y lo refresca por su
+    cuenta; nunca lanza el flujo OAuth. El refresco en línea de get_gdrive_service
+    queda como respaldo.
+    """
+    global _REFRESHER_THREAD
+    if not GOOGLE_LIBS_AVAILABLE:
+        return
+    with _REFRESHER_LOCK:
+        if _REFRESHER_THREAD is None:
+            _REFRESHER_THREAD = threading.Thread(target=_token_refresher_loop,
+                                                 name='gdrive-token-refresher', daemon=True)
+            _REFRESHER_THREAD.start()
+
+def _authorized_http(creds=None):
+    """
+    AuthorizedHttp del hilo actual, reutilizado entre peticiones para no repetir el
+    handshake TCP+TLS. Se recrea si cambian las credenciales cacheadas.
+    """
+    creds = creds or _CREDS_CACHE
+    cached = getattr(_HTTP_LOCAL, 'cached', None)
+    if cached is None or cached[0] is not creds:
+        # build_http() quita el 308 de los códigos de redirección: Drive lo usa como
+        # "Resume Incomplete" (sin Location) en las subidas reanudables.
+        base = build_http()
+        base.timeout = GDRIVE_HTTP_TIMEOUT
+        http = AuthorizedHttp(creds, http=base)
+        _HTTP_LOCAL.cached = cached = (creds, http)
+    return cached[1]
+
+def get_gdrive_service(force=False):
+    """
+    Servicio de Google Drive cacheado a nivel de módulo (thread-safe). Se reconstruye solo
+    si las credenciales dejaron de ser válidas o con `force`. None si no está disponible.
+    """
+    global _CREDS_CACHE, _SERVICE_CACHE
+    if not GOOGLE_LIBS_AVAILABLE:
         return None
+    with _SERVICE_LOCK:
+        if not force and _SERVICE_CACHE is not None and _CREDS_CACHE.valid:
+            return _SERVICE_CACHE
+
+        creds = _load_creds(None if force else _CREDS_CACHE)
+        if not creds:
+            return None
+        try:
+            # Documento de discovery incluido en la biblioteca (google-api-python-client >= 2.0):
+            # sin petición HTTP ni parseo del JSON remoto al construir
+            service = build('drive', 'v3', http=_authorized_http(creds),
+                            cache_discovery=False, static_discovery=True)
+        except Exception as e:
+            print(f"Error creando servicio de Google Drive: {e}")
+            return None
+        _CREDS_CACHE, _SERVICE_CACHE = creds, service
+    start_token_refresher()
+    return service
+
+def _stdout_is_tty():
+    """ Con la salida redirigida (cron, systemd) no tiene sentido repintar el progreso. """
+    try:
+        return sys.stdout.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+class _ProgressCounter:
+    """
+    Contador de tareas terminadas que actualizan los workers bajo un lock; un solo hilo
+    lo muestra cada PROGRESS_INTERVAL_SECONDS, en vez de un print por tarea. Sin terminal
+    no hay hilo: solo se imprime el total al cerrar.
+    """
+
+    def __init__(self, label, total):
+        self._label = label
+        self._total = total
+        self._done = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if _stdout_is_tty():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def add(self, count=1):
+        with self._lock:
+            self._done += count
+
+    def _render(self):
+        prefix = "\r" if self._thread is not None else ""
+        print(f"{prefix}{self._label}: {self._done}/{self._total}", end="", flush=True)
+
+    def _run(self):
+        shown = None
+        if self._stop.wait(PROGRESS_MIN_SECONDS): # Lotes cortos: solo la línea final
+            return
+        while not self._stop.wait(PROGRESS_INTERVAL_SECONDS):
+            if self._done != shown:
+                shown = self._done
+                self._render()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._render()
+        print()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _direct_copy(src, dst, out_fd, size):
+    """
+    Copia con O_DIRECT y un buffer alineado (mmap anónimo): los datos van del origen al
+    destino sin llenar la caché de páginas con fragmentos que no se volverán a leer.
+    La cola no alineada se escribe por el fd normal `out_fd`. Devuelve los bytes copiados.
+    """
+    copied = 0
+    direct_in = os.open(src, os.O_RDONLY | os.O_DIRECT)
+    try:
+        direct_out = os.open(dst, os.O_WRONLY | os.O_DIRECT)
+        try:
+            with mmap.mmap(-1, COPY_BUFFER_SIZE) as buffer, memoryview(buffer) as view:
+                while copied < size:
+                    read = os.preadv(direct_in, [view], copied)
+                    if read == 0:
+                        break
+                    aligned = read - read % DIRECT_IO_ALIGNMENT
+                    written = 0
+                    while written < aligned:
+                        written += os.pwrite(direct_out, view[written:aligned], copied + written)
+                    while written < read: # Cola del archivo: no cumple la alineación de O_DIRECT
+                        written += os.pwrite(out_fd, view[written:read], copied + written)
+                    copied += read
+        finally:
+            os.close(direct_out)
+    finally:
+        os.close(direct_in)
+    return copied
+
+def _fast_copy(src, dst):
+    """
+    Copia el contenido de `src` a `dst`. Entre dispositivos distintos (p. ej. a un USB)
+    los archivos grandes se copian con O_DIRECT; en otro caso, o si el sistema de
+    archivos no lo admite, con _copy_range (copy_file_range/reflink, sendfile o
+    pread/write). No copia metadatos (a diferencia de copy2).
+    """
+    in_fd = os.open(src, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        out_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o666)
+        try:
+            in_stat = os.fstat(in_fd)
+            size = in_stat.st_size
+            if hasattr(os, 'posix_fadvise'): # Para las copias que sí pasan por la caché de páginas
+                os.posix_fadvise(in_fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                os.posix_fadvise(in_fd, 0, 0, os.POSIX_FADV_NOREUSE)
+            # En el mismo dispositivo copy_file_range puede compartir extents (reflink)
+            if (size >= COPY_BUFFER_SIZE and hasattr(os, 'O_DIRECT') and hasattr(os, 'preadv')
+                    and os.fstat(out_fd).st_dev != in_stat.st_dev):
+                try:
+                    if _direct_copy(src, dst, out_fd, size) >= size:
+                        return
+                except OSError as e:
+                    if e.errno not in _COPY_FALLBACK_ERRNOS:
+                        raise
+                os.lseek(out_fd, 0, os.SEEK_SET) # Se repite la copia completa por otro método
+            _copy_range(in_fd, out_fd, 0, size)
+        finally:
+            os.close(out_fd)
+    finally:
+        os.close(in_fd)
 
 def copy_to_local_disk(source_file_path, destination_path):
     if not os.path.exists(source_file_path):
@@ -74,17 +370,118 @@ def copy_to_local_disk(source_file_path, destination_path):
         destination_dir = os.path.dirname(destination_path)
         if not os.path.exists(destination_dir):
             os.makedirs(destination_dir, exist_ok=True)
-        shutil.copy2(source_file_path, destination_path)
+        _fast_copy(source_file_path, destination_path)
         print(f"Archivo copiado de '{source_file_path}' a '{destination_path}'")
     except Exception as e:
         raise IOError(f"Error al copiar a disco local '{destination_path}': {e}")
 
-@dask.delayed
-def _upload_file_to_gdrive_task(local_file_path, cloud_folder_id, filename_on_cloud):
-    service = get_gdrive_service() 
+if GOOGLE_LIBS_AVAILABLE:
+    class _HashingMediaFileUpload(MediaFileUpload):
+        """
+        MediaFileUpload que calcula el MD5 de los bytes a medida que se envían, para
+        verificar la subida sin volver a leer el archivo. Los trozos que se reenvían
+        tras un reintento no se vuelven a hashear.
+        El archivo se mapea en memoria: el MD5 se calcula sobre las mismas páginas de la
+        caché que se envían, sin copiarlas antes a un buffer intermedio.
+        """
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._md5 = hashlib.md5()
+            self._hashed = 0
+            self._map = None
+            if self.size(): # mmap no admite archivos vacíos
+                self._map = mmap.mmap(self._fd.fileno(), 0, access=mmap.ACCESS_READ)
+                if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    self._map.madvise(mmap.MADV_SEQUENTIAL) # Lectura anticipada agresiva
+
+        def has_stream(self):
+            # Obliga a pedir los trozos con getbytes(), que es donde se hashean
+            return False
+
+        def getbytes(self, begin, length):
+            if self._map is None:
+                return super().getbytes(begin, length)
+            end = min(begin + length, self.size())
+            if begin <= self._hashed < end:
+                with memoryview(self._map) as view:
+                    self._md5.update(view[self._hashed:end])
+                self._hashed = end
+            return self._map[begin:end]
+
+        def close(self):
+            """ Libera el mapeo y el descriptor del archivo. """
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._fd.close()
+
+        def hexdigest(self):
+            """ MD5 del archivo, o None si no se llegó a leer entero. """
+            return self._md5.hexdigest() if self._hashed == self.size() else None
+
+class _HashingWriter:
+    """ Envuelve un archivo de escritura y calcula el MD5 de lo escrito, en orden. """
+    def __init__(self, fh, hasher):
+        self._fh = fh
+        self.hasher = hasher
+
+    def write(self, data):
+        self.hasher.update(data)
+        return self._fh.write(data)
+
+def _verify_md5(local_md5, drive_md5, filename):
+    """ Compara el MD5 calculado al transferir con el md5Checksum de Drive. """
+    if local_md5 is None or drive_md5 is None: # Archivos de Google Docs no tienen md5Checksum
+        return
+    if local_md5 != drive_md5:
+        raise IOError(f"El MD5 de '{filename}' no coincide con el de Google Drive "
+                      f"(local {local_md5}, Drive {drive_md5}).")
+
+def _file_md5(path):
+    """ MD5 de un archivo local, leído en bloques de COPY_BUFFER_SIZE. """
+    md5 = hashlib.md5()
+    buffer = bytearray(COPY_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            md5.update(view[:read])
+    return md5.hexdigest()
+
+def _find_identical_in_gdrive(service, folder_id, filename, local_file_path, local_size):
+    """
+    Devuelve el ID de un archivo de la carpeta con el mismo nombre, tamaño y MD5 que el
+    local, o None. Solo se hashea el archivo local si el nombre y el tamaño coinciden.
+    """
+    if not folder_id:
+        return None
+    try:
+        file_id, size, md5 = list_folder_index(service, folder_id).get(filename, (None, None, None))
+    except Exception as e:
+        logger.debug("No se pudo consultar la carpeta ID %s antes de subir: %s", folder_id, e)
+        return None
+    if not file_id or not md5 or size is None or int(size) != local_size:
+        return None
+    return file_id if _file_md5(local_file_path) == md5 else None
+
+def _delete_from_gdrive(service, file_id, filename):
+    """ Borra un archivo de Drive; un fallo solo se registra. """
+    try:
+        service.files().delete(fileId=file_id).execute(http=_authorized_http())
+    except Exception as e:
+        logger.error("No se pudo borrar de Google Drive la copia corrupta de '%s' (ID: %s): %s",
+                     filename, file_id, e)
+
+def _upload_file_to_gdrive(service, local_file_path, cloud_folder_id, filename_on_cloud):
+    """
+    Sube un archivo. Devuelve (id o None si falló, nombre, omitido): `omitido` indica
+    que ya había en la carpeta un archivo idéntico y no se subió nada.
+    """
     if not service:
-        print("Servicio de Google Drive no disponible para la tarea de subida.")
-        return None, filename_on_cloud # Devolver también el nombre para identificar el fallo
+        logger.error("Servicio de Google Drive no disponible para la tarea de subida.")
+        return None, filename_on_cloud, False # Devolver también el nombre para identificar el fallo
     
     file_metadata = {
         'name': filename_on_cloud,
@@ -97,16 +494,32 @@ def _upload_file_to_gdrive_task(local_file_path, cloud_folder_id, filename_on_cl
     elif filename_on_cloud.lower().endswith(('.txt', '.log')):
         mimetype = 'text/plain'
     
-    media = MediaFileUpload(local_file_path, resumable=True, mimetype=mimetype) 
+    local_size = os.path.getsize(local_file_path)
+    existing_id = _find_identical_in_gdrive(service, cloud_folder_id, filename_on_cloud, local_file_path, local_size)
+    if existing_id:
+        return existing_id, filename_on_cloud, True
+
+    resumable = local_size >= GDRIVE_SIMPLE_UPLOAD_MAX
+    media = _HashingMediaFileUpload(local_file_path, mimetype=mimetype, resumable=resumable,
+                                    chunksize=GDRIVE_UPLOAD_CHUNK)
     
     try:
-        print(f"\rDask: Subiendo '{local_file_path}' a Google Drive como '{filename_on_cloud}' (Carpeta ID: {cloud_folder_id})...", end="")
-        file_drive = service.files().create(body=file_metadata, media_body=media, fields='id, name').execute()
-        print(f"\nArchivo '{file_drive.get('name')}' subido a Google Drive con ID: {file_drive.get('id')}")
-        return file_drive.get('id'), filename_on_cloud
+        logger.debug("Subiendo '%s' a Google Drive como '%s' (Carpeta ID: %s)", local_file_path, filename_on_cloud, cloud_folder_id)
+        file_drive = service.files().create(body=file_metadata, media_body=media,
+                                            fields='id, name, md5Checksum').execute(http=_authorized_http())
+        try:
+            _verify_md5(media.hexdigest(), file_drive.get('md5Checksum'), filename_on_cloud)
+        except IOError:
+            # No dejar en la carpeta una copia corrupta con el nombre definitivo
+            _delete_from_gdrive(service, file_drive.get('id'), filename_on_cloud)
+            raise
+        logger.debug("Archivo '%s' subido a Google Drive con ID: %s", file_drive.get('name'), file_drive.get('id'))
+        return file_drive.get('id'), filename_on_cloud, False
     except Exception as e:
-        print(f"\nError al subir '{local_file_path}' a Google Drive: {e}")
-        return None, filename_on_cloud
+        logger.error("Error al subir '%s' a Google Drive: %s", local_file_path, e)
+        return None, filename_on_cloud, False
+    finally:
+        media.close()
 
 def upload_to_google_drive(local_file_path, cloud_folder_id, filename_on_cloud=None):
     if not GOOGLE_LIBS_AVAILABLE:
@@ -122,37 +535,189 @@ def upload_to_google_drive(local_file_path, cloud_folder_id, filename_on_cloud=N
     if not service:
         raise ConnectionError("No se pudo obtener el servicio de Google Drive.")
 
-    task = _upload_file_to_gdrive_task(local_file_path, cloud_folder_id, filename_on_cloud)
-    print(f"Programando subida de '{filename_on_cloud}' a Google Drive con Dask...")
-    with ProgressBar():
-        results = dask.compute(task, scheduler='threads')
-        file_id, name = results[0] # dask.compute devuelve una tupla de resultados
+    # Un solo archivo: se sube en este hilo, sin montar un grafo ni un scheduler
+    print(f"Subiendo '{local_file_path}' a Google Drive como '{filename_on_cloud}' (Carpeta ID: {cloud_folder_id})...")
+    file_id, name, skipped = _upload_file_to_gdrive(service, local_file_path, cloud_folder_id, filename_on_cloud)
     
     if file_id is None:
         raise IOError(f"Falló la subida del archivo '{name}' a Google Drive.")
+    if skipped:
+        print(f"Archivo '{name}' ya existía en Drive con el mismo contenido (ID: {file_id}), no se subió.")
+    else:
+        print(f"Archivo '{name}' subido a Google Drive con ID: {file_id}")
+    invalidate_folder_index(cloud_folder_id)
     return file_id
 
+def upload_many_to_google_drive(local_file_paths, cloud_folder_id):
+    """
+    Sube varios archivos a una carpeta de Drive con GDRIVE_UPLOAD_WORKERS subidas
+    simultáneas (cada hilo con su propia conexión). Devuelve {ruta: id en Drive}.
+    La API de lotes de Drive no admite contenido (media), así que cada archivo es una
+    petición propia; los pequeños van en una sola petición, sin sesión reanudable.
+    """
+    if not GOOGLE_LIBS_AVAILABLE:
+        raise EnvironmentError("Bibliotecas de Google no disponibles.")
+
+    missing = [path for path in local_file_paths if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"Archivos locales no encontrados para subir: {', '.join(missing)}")
+
+    service = get_gdrive_service()
+    if not service:
+        raise ConnectionError("No se pudo obtener el servicio de Google Drive.")
+
+    if cloud_folder_id:
+        try:
+            list_folder_index(service, cloud_folder_id) # Un listado para todas las comprobaciones de duplicados
+        except Exception as e:
+            logger.debug("No se pudo listar la carpeta ID %s: %s", cloud_folder_id, e)
+    print(f"Subiendo {len(local_file_paths)} archivos a Google Drive con {GDRIVE_UPLOAD_WORKERS} hilos...")
+    file_ids = {}
+    num_skipped = 0
+    with ThreadPoolExecutor(max_workers=GDRIVE_UPLOAD_WORKERS) as executor, \
+            _ProgressCounter("Archivos procesados", len(local_file_paths)) as progress:
+        futures = {
+            executor.submit(_upload_file_to_gdrive, service, path, cloud_folder_id, os.path.basename(path)): path
+            for path in local_file_paths
+        }
+        for future in as_completed(futures):
+            file_id, _, skipped = future.result()
+            file_ids[futures[future]] = file_id
+            num_skipped += skipped
+            progress.add()
+    invalidate_folder_index(cloud_folder_id)
+
+    failed = [path for path, file_id in file_ids.items() if file_id is None]
+    if failed:
+        raise IOError(f"Falló la subida de {len(failed)} archivos a Google Drive: {', '.join(os.path.basename(p) for p in failed)}")
+    if num_skipped:
+        print(f"{num_skipped} archivos ya existían en Drive con el mismo contenido, no se subieron.")
+    return file_ids
+
+def list_folder_index(service, folder_id, max_age=GDRIVE_INDEX_TTL_SECONDS):
+    """
+    Lista los archivos de una carpeta de Drive en páginas de hasta 1000 y devuelve
+    {nombre: (id, tamaño, md5)}. El resultado se cachea `max_age` segundos por carpeta.
+    """
+    now = time.monotonic()
+    with _FOLDER_INDEX_LOCK:
+        cached = _FOLDER_INDEX_CACHE.get(folder_id)
+        if cached and now - cached[0] < max_age:
+            _FOLDER_INDEX_CACHE.move_to_end(folder_id)
+            return cached[1]
+
+    safe_folder_id = folder_id.replace("'", "\\'")
+    query = f"'{safe_folder_id}' in parents and trashed = false"
+    index = {}
+    page_token = None
+    while True:
+        response = service.files().list(q=query,
+                                        spaces='drive',
+                                        pageSize=GDRIVE_LIST_PAGE_SIZE,
+                                        pageToken=page_token,
+                                        fields='nextPageToken, files(id, name, size, md5Checksum)'
+                                        ).execute(http=_authorized_http())
+        for file_drive in response.get('files', []):
+            name = file_drive['name']
+            if name in index:
+                print(f"Advertencia: Se encontraron múltiples archivos con el nombre '{name}' en la carpeta ID '{folder_id}'. Se usará el primero.")
+                continue
+            index[name] = (file_drive['id'], file_drive.get('size'), file_drive.get('md5Checksum'))
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            break
+
+    with _FOLDER_INDEX_LOCK:
+        _FOLDER_INDEX_CACHE[folder_id] = (now, index)
+        _FOLDER_INDEX_CACHE.move_to_end(folder_id)
+        while len(_FOLDER_INDEX_CACHE) > GDRIVE_INDEX_CACHE_SIZE:
+            _FOLDER_INDEX_CACHE.popitem(last=False)
+    return index
+
+def invalidate_folder_index(folder_id):
+    """ Descarta el índice cacheado de una carpeta (p. ej. tras subir un archivo a ella). """
+    with _FOLDER_INDEX_LOCK:
+        _FOLDER_INDEX_CACHE.pop(folder_id, None)
+
 def find_file_in_gdrive(service, folder_id, filename):
     """Busca un archivo por nombre dentro de una carpeta específica en Google Drive."""
     if not service: return None, None
     try:
-        safe_filename = filename.replace("'", "\\'")
-        query = f"name = '{safe_filename}' and '{folder_id}' in parents and trashed = false"
-        
-        response = service.files().list(q=query,
-                                        spaces='drive',
-                                        pageSize=1, # Solo necesitamos uno si existe
-                                        fields='files(id, name, size)').execute()
-        files = response.get('files', [])
-        if files:
-            if len(files) > 1: # Debería ser raro con pageSize=1, pero por si acaso
-                print(f"Advertencia: Se encontraron múltiples archivos con el nombre '{filename}' en la carpeta ID '{folder_id}'. Se usará el primero.")
-            return files[0]['id'], files[0].get('size')
-        return None, None
+        file_id, size, _ = list_folder_index(service, folder_id).get(filename, (None, None, None))
+        return file_id, size
     except Exception as e:
         print(f"Error buscando archivo '{filename}' en Google Drive (carpeta ID {folder_id}): {e}")
         return None, None
 
+def _drop_page_cache(fd):
+    """ Tras una descarga, libera de la caché de páginas lo ya escrito a disco (solo Linux). """
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+
+def _download_range(uri, fd, start, end):
+    """ Tarea del pool: descarga los bytes [start, end] de `uri` y los escribe en fd con pwrite. """
+    for attempt in range(GDRIVE_RANGE_RETRIES + 1):
+        try:
+            response, content = _authorized_http().request(
+                uri, 'GET', headers={'Range': f'bytes={start}-{end}'})
+            if response.status != 206 or len(content) != end - start + 1:
+                raise IOError(f"respuesta inesperada para el rango {start}-{end}: HTTP {response.status}, "
+                              f"{len(content)} bytes")
+            break
+        except Exception:
+            if attempt == GDRIVE_RANGE_RETRIES:
+                raise
+            time.sleep(2 ** attempt) # Espera exponencial antes de reintentar
+    view = memoryview(content)
+    offset = start
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+    return content
+
+def _parallel_download(uri, local_file_destination, file_size):
+    """
+    Descarga `uri` por rangos de GDRIVE_DOWNLOAD_CHUNK en paralelo a un archivo preasignado.
+    Los rangos se hashean en orden a medida que terminan; devuelve el MD5 del archivo.
+    """
+    fd = os.open(local_file_destination, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        if not _preallocate(fd, file_size):
+            os.ftruncate(fd, file_size)
+        ranges = [(start, min(start + GDRIVE_DOWNLOAD_CHUNK, file_size) - 1)
+                  for start in range(0, file_size, GDRIVE_DOWNLOAD_CHUNK)]
+        md5 = hashlib.md5()
+        pending = iter(ranges)
+        show_progress = _stdout_is_tty()
+        in_flight = deque()
+        done = 0
+        with ThreadPoolExecutor(max_workers=GDRIVE_DOWNLOAD_WORKERS) as executor:
+            try:
+                for start, end in pending:
+                    in_flight.append(executor.submit(_download_range, uri, fd, start, end))
+                    if len(in_flight) >= GDRIVE_DOWNLOAD_WINDOW:
+                        break
+                while in_flight:
+                    md5.update(in_flight.popleft().result()) # Propaga el primer error
+                    done += 1
+                    if show_progress:
+                        print(f"\rProgreso de descarga: {int(done * 100 / len(ranges))}%", end="")
+                    next_range = next(pending, None)
+                    if next_range:
+                        in_flight.append(executor.submit(_download_range, uri, fd, *next_range))
+            except BaseException:
+                for future in in_flight:
+                    future.cancel()
+                raise
+        _drop_page_cache(fd)
+        return md5.hexdigest()
+    finally:
+        os.close(fd)
+
 def download_from_google_drive(folder_id_or_file_id, filename_on_drive, local_download_path):
     """
     Descarga un archivo de Google Drive.
@@ -166,14 +731,16 @@ def download_from_google_drive(folder_id_or_file_id, filename_on_drive, local_do
 
     file_id_to_download = None
     file_size_str = None
+    drive_md5 = None
     actual_filename_on_drive = filename_on_drive
 
     try:
-        file_metadata = service.files().get(fileId=folder_id_or_file_id, fields="id, name, size, mimeType").execute()
+        file_metadata = service.files().get(fileId=folder_id_or_file_id, fields="id, name, size, mimeType, md5Checksum").execute(http=_authorized_http())
         # Si lo anterior tiene éxito, folder_id_or_file_id era un file_id
         file_id_to_download = file_metadata.get('id')
         actual_filename_on_drive = file_metadata.get('name') 
         file_size_str = file_metadata.get('size')
+        drive_md5 = file_metadata.get('md5Checksum')
         # Ignorar si el archivo es una carpeta de Google Drive
         if file_metadata.get('mimeType') == 'application/vnd.google-apps.folder':
             print(f"El ID '{folder_id_or_file_id}' corresponde a una carpeta de Google Drive, no a un archivo descargable directamente por nombre '{filename_on_drive}'.")
@@ -186,7 +753,11 @@ def download_from_google_drive(folder_id_or_file_id, filename_on_drive, local_do
         if not actual_filename_on_drive: # filename_on_drive original
             raise ValueError("Se requiere `filename_on_drive` si `folder_id_or_file_id` es un ID de carpeta o no se pudo resolver como ID de archivo.")
         print(f"Buscando archivo '{actual_filename_on_drive}' en carpeta de Google Drive ID '{folder_id_or_file_id}'...")
-        file_id_to_download, file_size_str = find_file_in_gdrive(service, folder_id_or_file_id, actual_filename_on_drive)
+        try:
+            file_id_to_download, file_size_str, drive_md5 = list_folder_index(service, folder_id_or_file_id).get(
+                actual_filename_on_drive, (None, None, None))
+        except Exception as e:
+            print(f"Error buscando archivo '{actual_filename_on_drive}' en Google Drive (carpeta ID {folder_id_or_file_id}): {e}")
 
     if not file_id_to_download:
         raise FileNotFoundError(f"Archivo '{actual_filename_on_drive}' no encontrado en Google Drive (ubicación especificada: {folder_id_or_file_id}).")
@@ -202,16 +773,30 @@ def download_from_google_drive(folder_id_or_file_id, filename_on_drive, local_do
 
     print(f"Descargando archivo '{actual_filename_on_drive}' (ID: {file_id_to_download}, Tamaño: {file_size_str if file_size_str else 'N/A'}) de Google Drive a '{local_file_destination}'...")
     request = service.files().get_media(fileId=file_id_to_download)
+    request.http = _authorized_http()
     
+    file_size = int(file_size_str) if file_size_str else None
     try:
-        with io.FileIO(local_file_destination, 'wb') as fh:
-            downloader = MediaIoBaseDownload(fh, request, chunksize=1024*1024*5) # Chunks de 5MB
-            done = False
-            while not done:
-                status, done = downloader.next_chunk(num_retries=3) # Añadir reintentos
-                if status:
-                    print(f"\rProgreso de descarga: {int(status.progress() * 100)}%", end="")
-            print("\nDescarga completada.")
+        if file_size is not None and file_size >= GDRIVE_PARALLEL_DOWNLOAD_MIN and hasattr(os, 'pwrite'):
+            local_md5 = _parallel_download(request.uri, local_file_destination, file_size)
+        else:
+            fd = os.open(local_file_destination, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_CLOEXEC', 0), 0o666)
+            with io.FileIO(fd, 'wb') as fh:
+                preallocated = _preallocate(fd, file_size)
+                writer = _HashingWriter(fh, hashlib.md5())
+                downloader = MediaIoBaseDownload(writer, request, chunksize=GDRIVE_DOWNLOAD_CHUNK)
+                done = False
+                show_progress = _stdout_is_tty()
+                while not done:
+                    status, done = downloader.next_chunk(num_retries=3) # Añadir reintentos
+                    if status and show_progress:
+                        print(f"\rProgreso de descarga: {int(status.progress() * 100)}%", end="")
+                if preallocated:
+                    os.ftruncate(fd, fh.tell()) # Por si Drive devolvió menos bytes que el tamaño anunciado
+                _drop_page_cache(fd)
+            local_md5 = writer.hasher.hexdigest()
+        _verify_md5(local_md5, drive_md5, actual_filename_on_drive)
+        print("\nDescarga completada.")
     except Exception as e:
         if os.path.exists(local_file_destination):
             try:
@@ -223,16 +808,185 @@ def download_from_google_drive(folder_id_or_file_id, filename_on_drive, local_do
     return local_file_destination
 
 
-@dask.delayed
 def _copy_single_fragment_to_usb_task(fragment_path, usb_destination_file_path):
     try:
-        # print(f"Dask: Copiando {os.path.basename(fragment_path)} a USB...")
-        shutil.copy2(fragment_path, usb_destination_file_path)
+        # Solo el contenido: los metadatos de copy2 no aportan nada a un fragmento
+        _fast_copy(fragment_path, usb_destination_file_path)
         return usb_destination_file_path, True
     except Exception as e:
-        print(f"Error copiando fragmento {os.path.basename(fragment_path)} a USB '{usb_destination_file_path}': {e}")
+        logger.error("Error copiando fragmento %s a USB '%s': %s", os.path.basename(fragment_path), usb_destination_file_path, e)
         return usb_destination_file_path, False
 
+class _UringFragmentCopy:
+    """
+    Copia fragmentos completos con un único io_uring: trozos de URING_USB_BUFFER_SIZE de
+    todos los fragmentos se leen y escriben a la vez (hasta URING_USB_QUEUE_DEPTH en vuelo),
+    con una llamada a io_uring_submit por tanda en vez de un read/write por trozo.
+    Cada buffer pasa por lectura y luego escritura; los archivos se abren al empezar a
+    copiarse y se cierran al terminar, así que los fd abiertos están acotados.
+    """
+
+    def __init__(self, tasks):
+        self._tasks = iter(tasks)
+        self._progress = None
+        self._ring = Ring()
+        self._cqe = Cqe()
+        io_uring_queue_init(URING_USB_QUEUE_DEPTH, self._ring)
+        self._files = {} # id -> [destino, fd origen, fd destino, siguiente offset, tamaño, trozos en vuelo, error]
+        self._slots = {} # id de operación -> (id de archivo, offset, buffer, es_escritura)
+        self._next_file = 0
+        self._next_op = 0
+        self._current = None # Archivo del que se están encolando trozos
+        self.results = []
+
+    def run(self, progress=None):
+        """ Copia todos los fragmentos; devuelve [(destino, éxito)]. """
+        self._progress = progress
+        try:
+            while True:
+                while len(self._slots) < URING_USB_QUEUE_DEPTH and self._queue_next_read():
+                    pass
+                if not self._slots:
+                    break
+                io_uring_submit(self._ring)
+                self._reap_one()
+        finally:
+            for file_id in list(self._files):
+                self._finish(file_id, self._files[file_id][6] or IOError("copia interrumpida"))
+            io_uring_queue_exit(self._ring)
+        return self.results
+
+    def _open_next(self):
+        for src, dst in self._tasks:
+            src_fd = dst_fd = -1
+            try:
+                src_fd = os.open(src, os.O_RDONLY)
+                dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+                size = os.fstat(src_fd).st_size
+            except OSError as e:
+                for fd in (src_fd, dst_fd):
+                    if fd >= 0:
+                        os.close(fd)
+                logger.error("Error copiando fragmento %s a USB '%s': %s", os.path.basename(src), dst, e)
+                self._record(dst, False)
+                continue
+            file_id = self._next_file
+            self._next_file += 1
+            self._files[file_id] = [dst, src_fd, dst_fd, 0, size, 0, None]
+            if not size:
+                self._finish(file_id, None)
+                continue
+            return file_id
+        return None
+
+    def _queue_next_read(self):
+        if self._current is None:
+            self._current = self._open_next()
+            if self._current is None:
+                return False
+        entry = self._files[self._current]
+        offset = entry[3]
+        length = min(URING_USB_BUFFER_SIZE, entry[4] - offset)
+        self._submit(self._current, offset, bytearray(length), False)
+        entry[3] += length
+        if entry[3] >= entry[4]:
+            self._current = None # Todos sus trozos están encolados
+        return True
+
+    def _submit(self, file_id, offset, buf, is_write):
+        entry = self._files[file_id]
+        op_id = self._next_op
+        self._next_op += 1
+        sqe = io_uring_get_sqe(self._ring)
+        if is_write:
+            io_uring_prep_write(sqe, entry[2], buf, offset)
+        else:
+            io_uring_prep_read(sqe, entry[1], buf, offset)
+        io_uring_sqe_set_data64(sqe, op_id)
+        self._slots[op_id] = (file_id, offset, buf, is_write)
+        entry[5] += 1
+
+    def _reap_one(self):
+        io_uring_wait_cqe(self._ring, self._cqe)
+        cqe = self._cqe[0]
+        op_id = cqe.user_data
+        try:
+            res = cqe.res
+        except OSError as e: # La extensión expone los resultados negativos como OSError
+            res = -e.errno
+        io_uring_cq_advance(self._ring, 1)
+
+        file_id, offset, buf, is_write = self._slots.pop(op_id)
+        entry = self._files[file_id]
+        entry[5] -= 1
+        if entry[6] is None:
+            if res < 0:
+                entry[6] = OSError(-res, os.strerror(-res))
+            elif not is_write and res == 0:
+                entry[6] = IOError(f"fin de archivo inesperado en el offset {offset}")
+            elif not is_write:
+                if res < len(buf): # Lectura corta: se vuelve a pedir el resto
+                    self._submit(file_id, offset + res, bytearray(len(buf) - res), False)
+                    buf = buf[:res]
+                self._submit(file_id, offset, buf, True)
+            elif res < len(buf): # Escritura corta: se reenvía el resto
+                self._submit(file_id, offset + res, buf[res:], True)
+        if entry[6] is not None and self._current == file_id:
+            self._current = None # No se encolan más trozos de un archivo fallido
+        if self._current != file_id and not entry[5]:
+            self._finish(file_id, entry[6])
+
+    def _finish(self, file_id, error):
+        dst, src_fd, dst_fd = self._files.pop(file_id)[:3]
+        if self._current == file_id:
+            self._current = None
+        os.close(src_fd)
+        try:
+            os.close(dst_fd)
+        except OSError as e:
+            error = error or e
+        if error is not None:
+            logger.error("Error copiando fragmento a USB '%s': %s", dst, error)
+        self._record(dst, error is None)
+
+    def _record(self, dst, success):
+        self.results.append((dst, success))
+        if self._progress is not None:
+            self._progress.add()
+
+def _is_fragment_name(filename):
+    """ Los fragmentos de split_file se llaman '<archivo>.partNNN'. """
+    _, sep, number = filename.rpartition('.part')
+    return bool(sep) and number.isdigit()
+
+def _copy_fragments_by_device(tasks, progress):
+    """
+    Copia los fragmentos con un pool de USB_COPY_WORKERS_PER_DEVICE hilos por cada
+    dispositivo de destino. Devuelve [(destino, éxito)] en orden de finalización.
+    """
+    device_of_dir = {}
+    tasks_by_device = {}
+    for task in tasks:
+        target_dir = os.path.dirname(task[1]) or os.curdir
+        if target_dir not in device_of_dir:
+            device_of_dir[target_dir] = os.stat(target_dir).st_dev
+        tasks_by_device.setdefault(device_of_dir[target_dir], []).append(task)
+
+    pools = [ThreadPoolExecutor(max_workers=USB_COPY_WORKERS_PER_DEVICE) for _ in tasks_by_device]
+    results = []
+    try:
+        futures = [pool.submit(_copy_single_fragment_to_usb_task, *task)
+                   for pool, device_tasks in zip(pools, tasks_by_device.values())
+                   for task in device_tasks]
+        # Los errores se registran a medida que ocurren, no al final del lote
+        for future in as_completed(futures):
+            results.append(future.result())
+            progress.add()
+    finally:
+        for pool in pools:
+            pool.shutdown(wait=True)
+    return results
+
 def copy_fragments_to_usb(fragments_source_dir, usb_target_fragments_dir):
     if not os.path.isdir(fragments_source_dir):
         raise FileNotFoundError(f"Directorio fuente de fragmentos no encontrado: {fragments_source_dir}")
@@ -244,16 +998,28 @@ def copy_fragments_to_usb(fragments_source_dir, usb_target_fragments_dir):
         raise IOError(f"No se pudo crear el directorio de destino en USB '{usb_target_fragments_dir}': {e}")
 
     tasks = []
-    for fragment_filename in os.listdir(fragments_source_dir):
-        fragment_source_path = os.path.join(fragments_source_dir, fragment_filename)
-        if os.path.isfile(fragment_source_path) and ".part" in fragment_filename: # Simple check for fragment
-            usb_destination_file_path = os.path.join(usb_target_fragments_dir, fragment_filename)
-            tasks.append(_copy_single_fragment_to_usb_task(fragment_source_path, usb_destination_file_path))
+    # scandir trae el tipo de archivo en la entrada del directorio: sin un stat por archivo
+    with os.scandir(fragments_source_dir) as entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False) and _is_fragment_name(entry.name):
+                usb_destination_file_path = os.path.join(usb_target_fragments_dir, entry.name)
+                tasks.append((entry.path, usb_destination_file_path))
     
     if tasks:
-        print(f"Copiando {len(tasks)} fragmentos a USB con Dask...")
-        with ProgressBar():
-            results = dask.compute(*tasks, scheduler='threads')
+        results = None
+        if URING_AVAILABLE and _uring_supported():
+            try:
+                copier = _UringFragmentCopy(tasks)
+            except OSError as e: # io_uring_queue_init rechazado por el kernel
+                print(f"Advertencia: io_uring no disponible ({e}); se copian los fragmentos con hilos.")
+            else:
+                print(f"Copiando {len(tasks)} fragmentos a USB con io_uring...")
+                with _ProgressCounter("Fragmentos copiados", len(tasks)) as progress:
+                    results = copier.run(progress)
+        if results is None:
+            print(f"Copiando {len(tasks)} fragmentos a USB con {USB_COPY_WORKERS_PER_DEVICE} hilos por dispositivo...")
+            with _ProgressCounter("Fragmentos copiados", len(tasks)) as progress:
+                results = _copy_fragments_by_device(tasks, progress)
         
         num_failed = sum(1 for _, success in results if not success)
         if num_failed > 0: